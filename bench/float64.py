@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# Float64 implementations of the algorithms behind the datasets, timed on the dataset inputs and
+# compared with the mpmath references (yy) in ULP, to pick the fastest method within an accuracy budget
+import argparse
+import json
+import math
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.queries import segment
+from loader import open_dataset
+from verify_data import ulp_distance
+
+
+def load_cases(name):
+	# arrays bit for bit from the binary sidecar, copied out of the views before the dataset is closed
+	with open_dataset(name) as dataset:
+		return [{key: list(value) if isinstance(value, memoryview) else value for key, value in view._asdict().items()} for view in dataset.views()]
+
+
+def scan_segments(X, xx):
+	# the forward scan the splines used before the bisect lookup; only valid for ascending xx
+	i = 0
+	for x in xx:
+		while i < len(X) - 2 and x >= X[i+1]:
+			i += 1
+		yield i
+
+
+def bisect_segments(X, xx):
+	return (segment(X, x) for x in xx)
+
+
+# polynomial interpolation
+
+def lagrange(X, Y, xx):
+	yy = []
+	for x in xx:
+		total = 0.0
+		for k in range(len(X)):
+			term = Y[k]
+			for j in range(len(X)):
+				if j != k:
+					term *= (x - X[j]) / (X[k] - X[j])
+			total += term
+		yy.append(total)
+	return yy
+
+
+def newton(X, Y, xx):
+	c = list(Y)
+	for j in range(1, len(X)):
+		for i in reversed(range(j, len(X))):
+			c[i] = (c[i] - c[i-1]) / (X[i] - X[i-j])
+	yy = []
+	for x in xx:
+		result = c[-1]
+		for k in reversed(range(len(c) - 1)):
+			result = result * (x - X[k]) + c[k]
+		yy.append(result)
+	return yy
+
+
+def horner(coeffs, xx):
+	yy = []
+	for x in xx:
+		result = 0.0
+		for c in coeffs:
+			result = result * x + c
+		yy.append(result)
+	return yy
+
+
+def product_weights(X):
+	# as in misc: sums of log |x_k - x_j| with the signs counted apart, shifted by the largest before exp
+	if len(X) == 1:
+		return [1.0]
+	logs, signs = [], []
+	for k in range(len(X)):
+		differences = [X[k] - X[j] for j in range(len(X)) if j != k]
+		logs.append(-math.fsum(math.log(abs(d)) for d in differences))
+		signs.append(-1.0 if sum(d < 0 for d in differences) % 2 else 1.0)
+	top = max(logs)
+	return [sign * math.exp(log - top) for sign, log in zip(signs, logs)]
+
+
+def analytic_weights(dist, n):
+	if dist == 'uniform':
+		return [(-1)**k * float(math.comb(n - 1, k)) for k in range(n)]
+	elif dist == 'chebyshev':
+		return [(-1)**k * math.sin((2 * k + 1) * math.pi / (2 * n)) for k in range(n)]
+	elif dist == 'chebyshev_2':
+		return [(-1)**k * (0.5 if k == 0 or k == n - 1 else 1.0) for k in range(n)]
+	else:
+		raise ValueError(f'No closed-form weights for {dist!r}')
+
+
+def barycentric(X, Y, w, xx):
+	yy = []
+	for x in xx:
+		numerator, denominator = 0.0, 0.0
+		for k in range(len(X)):
+			if x == X[k]:
+				break
+			t = w[k] / (x - X[k])
+			numerator += t * Y[k]
+			denominator += t
+		else:
+			yy.append(numerator / denominator)
+			continue
+		yy.append(Y[k])
+	return yy
+
+
+# splines
+
+def step(case, segments):
+	X, Y, xx = case['X'], case['Y'], case['xx']
+	yy = []
+	for x, i in zip(xx, segments(X, xx)):
+		if abs(x - X[i]) < sys.float_info.epsilon:
+			yy.append(Y[i])
+		elif abs(x - X[i+1]) < sys.float_info.epsilon:
+			yy.append(Y[i+1])
+		elif case['type'] == 'left':
+			yy.append(Y[i])
+		elif case['type'] == 'middle':
+			yy.append((Y[i] + Y[i+1]) / 2)
+		else:
+			yy.append(Y[i+1])
+	return yy
+
+
+def piecewise_horner(X, coeffs, degree, xx, segments):
+	yy = []
+	for x, i in zip(xx, segments(X, xx)):
+		x_seg = x - X[i]
+		result = 0.0
+		for c in coeffs[(degree+1)*i:(degree+1)*(i+1)]:
+			result = result * x_seg + c
+		yy.append(result)
+	return yy
+
+
+def two_point(X, Y, xx):
+	yy = []
+	for x, i in zip(xx, bisect_segments(X, xx)):
+		yy.append(Y[i] + (Y[i+1] - Y[i]) / (X[i+1] - X[i]) * (x - X[i]))
+	return yy
+
+
+def lerp(X, Y, xx):
+	yy = []
+	for x, i in zip(xx, bisect_segments(X, xx)):
+		t = (x - X[i]) / (X[i+1] - X[i])
+		yy.append((1 - t) * Y[i] + t * Y[i+1])
+	return yy
+
+
+def quadratic_coefficients(X, Y, type):
+	# the construction of spline/generate_quadratic.py: the average of the splines swept from either end
+	n = len(X)
+	dX = [X[i+1] - X[i] for i in range(n - 1)]
+	dY = [Y[i+1] - Y[i] for i in range(n - 1)]
+	if type == 'semi-not-a-knot':
+		c = (dY[1]/dX[1] - dY[0]/dX[0]) / (dX[0] + dX[1])
+		spline1 = [[c, dY[0]/dX[0] - c*dX[0], Y[0]]] + [[0.0, 0.0, 0.0] for _ in range(n - 2)]
+		c = (dY[n-2]/dX[n-2] - dY[n-3]/dX[n-3]) / (dX[n-3] + dX[n-2])
+		spline2 = [[0.0, 0.0, 0.0] for _ in range(n - 2)] + [[c, dY[n-2]/dX[n-2] - c*dX[n-2], Y[n-2]]]
+	elif type == 'semi-natural':
+		spline1 = [[0.0, dY[0]/dX[0], Y[0]]] + [[0.0, 0.0, 0.0] for _ in range(n - 2)]
+		spline2 = [[0.0, 0.0, 0.0] for _ in range(n - 2)] + [[0.0, dY[n-2]/dX[n-2], Y[n-2]]]
+	else:
+		raise ValueError(f'Unexpected type: {type!r}')
+	for i in range(1, n - 1):
+		spline1[i][2] = Y[i]
+		spline1[i][1] = 2*dY[i-1]/dX[i-1] - spline1[i-1][1]
+		spline1[i][0] = (dY[i]/dX[i] - spline1[i][1]) / dX[i]
+		j = n - 2 - i
+		spline2[j][2] = Y[j]
+		spline2[j][1] = 2*dY[j]/dX[j] - spline2[j+1][1]
+		spline2[j][0] = (spline2[j+1][1] - dY[j]/dX[j]) / dX[j]
+	return [c for s1, s2 in zip(spline1, spline2) for c in [(c1+c2)/2 for c1, c2 in zip(s1, s2)]]
+
+
+def solve_tridiagonal(lower, diag, upper, rhs):
+	n = len(diag)
+	c = [0.0] * n
+	d = [0.0] * n
+	for i in range(n):
+		m = diag[i] - (lower[i] * c[i-1] if i > 0 else 0)
+		c[i] = upper[i] / m if i < n - 1 else 0
+		d[i] = (rhs[i] - (lower[i] * d[i-1] if i > 0 else 0)) / m
+	for i in reversed(range(n - 1)):
+		d[i] -= c[i] * d[i+1]
+	return d
+
+
+def cubic_coefficients(X, Y, type):
+	# the construction of spline/generate_cubic.py; clamped splines need the derivative of func, which the datasets lack
+	n = len(X)
+	h = [X[i+1] - X[i] for i in range(n - 1)]
+	delta = [(Y[i+1] - Y[i]) / h[i] for i in range(n - 1)]
+	lower = [0.0] + h[:-1] + [0.0]
+	diag = [1.0] + [2 * (h[i-1] + h[i]) for i in range(1, n - 1)] + [1.0]
+	upper = [0.0] + h[1:] + [0.0]
+	rhs = [0.0] + [6 * (delta[i] - delta[i-1]) for i in range(1, n - 1)] + [0.0]
+	if type == 'not-a-knot':
+		diag[1] += h[0] * (h[0] + h[1]) / h[1]
+		upper[1] -= h[0]**2 / h[1]
+		diag[n-2] += h[n-2] * (h[n-3] + h[n-2]) / h[n-3]
+		lower[n-2] -= h[n-2]**2 / h[n-3]
+		M = [None] + solve_tridiagonal(lower[1:n-1], diag[1:n-1], upper[1:n-1], rhs[1:n-1]) + [None]
+		M[0] = ((h[0] + h[1]) * M[1] - h[0] * M[2]) / h[1]
+		M[n-1] = ((h[n-3] + h[n-2]) * M[n-2] - h[n-2] * M[n-3]) / h[n-3]
+	elif type == 'natural':
+		M = solve_tridiagonal(lower, diag, upper, rhs)
+	else:
+		raise ValueError(f'Unexpected type: {type!r}')
+	coeffs = []
+	for i in range(n - 1):
+		coeffs += [(M[i+1] - M[i]) / (6 * h[i]), M[i] / 2, delta[i] - h[i] * (2 * M[i] + M[i+1]) / 6, Y[i]]
+	return coeffs
+
+
+# dataset: {variant: case -> yy}
+variants = {
+	'poly': {
+		'lagrange': lambda case: lagrange(case['X'], case['Y'], case['xx']),
+		'newton': lambda case: newton(case['X'], case['Y'], case['xx']),
+		'barycentric': lambda case: barycentric(case['X'], case['Y'], product_weights(case['X']), case['xx']),
+		'monomial': lambda case: horner(case['coeffs'], case['xx']),
+	},
+	'barycentric': {
+		'lagrange': lambda case: lagrange(case['X'], case['Y'], case['xx']),
+		'product-weights': lambda case: barycentric(case['X'], case['Y'], product_weights(case['X']), case['xx']),
+		'analytic-weights': lambda case: barycentric(case['X'], case['Y'], analytic_weights(case['dist'], len(case['X'])), case['xx']),
+	},
+	'step': {
+		'bisect': lambda case: step(case, bisect_segments),
+		'scan': lambda case: step(case, scan_segments),
+	},
+	'linear': {
+		'coeffs': lambda case: piecewise_horner(case['X'], case['coeffs'], 1, case['xx'], bisect_segments),
+		'coeffs-scan': lambda case: piecewise_horner(case['X'], case['coeffs'], 1, case['xx'], scan_segments),
+		'two-point': lambda case: two_point(case['X'], case['Y'], case['xx']),
+		'lerp': lambda case: lerp(case['X'], case['Y'], case['xx']),
+	},
+	'quadratic': {
+		'coeffs': lambda case: piecewise_horner(case['X'], case['coeffs'], 2, case['xx'], bisect_segments),
+		'coeffs-scan': lambda case: piecewise_horner(case['X'], case['coeffs'], 2, case['xx'], scan_segments),
+		'construct': lambda case: piecewise_horner(case['X'], quadratic_coefficients(case['X'], case['Y'], case['type']), 2, case['xx'], bisect_segments),
+	},
+	'cubic': {
+		'coeffs': lambda case: piecewise_horner(case['X'], case['coeffs'], 3, case['xx'], bisect_segments),
+		'coeffs-scan': lambda case: piecewise_horner(case['X'], case['coeffs'], 3, case['xx'], scan_segments),
+		'construct': lambda case: piecewise_horner(case['X'], cubic_coefficients(case['X'], case['Y'], case['type']), 3, case['xx'], bisect_segments),
+	},
+}
+
+
+def ulp_error(expected, actual, scale):
+	# the ULP distance, except for references below the rounding error of the largest value of their case, such as
+	# zeros, which float64 cannot resolve any closer: their error is counted in ULPs of that largest value
+	if abs(expected) < scale:
+		return abs(expected - actual) / scale
+	return ulp_distance(expected, actual)
+
+
+def run_variant(function, cases, repeat):
+	# best time over the repeats for all cases, construction included; the errors of the last run
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		results = [function(case) for case in cases]
+		times.append(time.perf_counter() - start)
+	errors = [ulp_error(expected, actual, math.ulp(max(map(abs, case['yy']), default=0.0))) for case, yy in zip(cases, results) for expected, actual in zip(case['yy'], yy)]
+	return {
+		'points': len(errors),
+		'time': min(times),
+		'throughput': len(errors) / min(times),
+		'max_ulp': max(errors),
+		'mean_ulp': sum(errors) / len(errors),
+	}
+
+
+def mark_pareto(results):
+	# a variant is on the front unless another one is at least as fast and as accurate, and better in one of them
+	for result in results.values():
+		result['pareto'] = not any(
+			other['throughput'] >= result['throughput'] and other['max_ulp'] <= result['max_ulp'] and (other['throughput'] > result['throughput'] or other['max_ulp'] < result['max_ulp'])
+			for other in results.values())
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Throughput and ULP error of float64 implementations against the mpmath references in the datasets')
+	parser.add_argument('datasets', nargs='*', help=f'Datasets to run: {", ".join(variants)} (default: all with float64 variants)')
+	parser.add_argument('-o', '--output', type=str, help='Also write the results to this JSON file')
+	parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of timed runs per variant (the best one is reported)')
+	parser.add_argument('--budget', type=float, help='Report the fastest variant of every dataset whose max ULP error is within this budget')
+	args = parser.parse_args()
+	unknown = [name for name in args.datasets if name not in variants]
+	if unknown:
+		parser.error(f'unknown datasets: {", ".join(unknown)} (choose from {", ".join(variants)})')
+	results = {}
+	print(f'{"dataset":<12} {"variant":<17} {"points":>7} {"points/s":>10} {"max ULP":>12} {"mean ULP":>12}  pareto')
+	for name in args.datasets or list(variants):
+		cases = load_cases(name)
+		results[name] = {variant: run_variant(function, cases, args.repeat) for variant, function in variants[name].items()}
+		mark_pareto(results[name])
+		for variant, result in sorted(results[name].items(), key=lambda item: -item[1]['throughput']):
+			print(f'{name:<12} {variant:<17} {result["points"]:>7} {result["throughput"]:>10.0f} {result["max_ulp"]:>12.0f} {result["mean_ulp"]:>12.1f}  {"*" if result["pareto"] else ""}')
+	if args.budget is not None:
+		print()
+		for name, dataset_results in results.items():
+			within = [(result['throughput'], variant) for variant, result in dataset_results.items() if result['max_ulp'] <= args.budget]
+			print(f'{name}: ' + (f'{max(within)[1]}' if within else f'no variant within {args.budget:g} ULP'))
+	if args.output:
+		with open(args.output, 'w') as file:
+			json.dump(results, file, indent='\t')
+
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sys
+import time
+from mpmath import mp
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import formatting
+from common.generators import generators, load_generator
+
+workloads = ['dist', 'poly']
+
+
+def collect_arrays(name):
+	# runs every case of the generator serially and records the arrays it formats
+	module = load_generator(name)
+	arrays = []
+	to_decimals = module.to_decimals
+	module.to_decimals = lambda array, *args: arrays.append(list(array)) or to_decimals(array, *args)
+	for params in module.test_cases:
+		module.generate_test_case(params)
+	return module, arrays
+
+
+def format_nstr(arrays, precision, zero_threshold):
+	return [['0' if abs(x) < zero_threshold else mp.nstr(x, n=precision).removesuffix('.0') for x in array] for array in arrays]
+
+
+def format_batched(arrays, precision, zero_threshold):
+	return [formatting.to_decimals(array, precision, zero_threshold) for array in arrays]
+
+
+def best_time(function, repeat):
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = function()
+		times.append(time.perf_counter() - start)
+	return min(times), result
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-r', '--repeat', type=int, default=5, help='Number of timed runs per formatter (the best one is reported)')
+	args = parser.parse_args()
+	print(f'{"workload":<18} {"values":>7} {"nstr":>9} {"batched":>9} {"speedup":>7} {"shortest":>9} {"bytes":>8} {"shortest bytes":>14}')
+	for name in workloads:
+		module, arrays = collect_arrays(name)
+		with mp.workdps(module.mp.dps):
+			precision, zero_threshold = module.precision, module.zero_threshold
+			nstr_time, expected = best_time(lambda: format_nstr(arrays, precision, zero_threshold), args.repeat)
+			batched_time, actual = best_time(lambda: format_batched(arrays, precision, zero_threshold), args.repeat)
+			if actual != expected:
+				raise ValueError(f'Batched formatter differs from mp.nstr on {name}')
+			formatting.set_mode('shortest')
+			try:
+				shortest_time, shortest = best_time(lambda: format_batched(arrays, precision, zero_threshold), args.repeat)
+			finally:
+				formatting.set_mode('decimal')
+		values = sum(len(array) for array in arrays)
+		size = sum(len(x) for array in expected for x in array)
+		shortest_size = sum(len(x) for array in shortest for x in array)
+		print(f'{generators[name][0]:<18} {values:>7} {nstr_time*1000:>7.1f}ms {batched_time*1000:>7.1f}ms {nstr_time/batched_time:>6.2f}x {shortest_time*1000:>7.1f}ms {size:>8} {shortest_size:>14}')
+
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.generators import generators, load_generator
+from common.profiling import describe_case
+from common.stream import ordered_map
+
+modules = {}
+
+
+def scale_case(params, n_scale):
+	# n is the first integer of every test case tuple
+	i = next(i for i, value in enumerate(params) if isinstance(value, int))
+	return params[:i] + (max(min(params[i], 1), round(params[i] * n_scale)),) + params[i+1:]
+
+
+def start_worker(name, nn):
+	# the workers load the generator and its scaled nn themselves rather than relying on a fork of the parent;
+	# a forked worker already has both
+	if name not in modules:
+		module = modules[name] = load_generator(name)
+		if nn is not None:
+			module.nn = nn
+
+
+def timed_case(name, params):
+	start = time.perf_counter()
+	modules[name].generate_test_case(params)
+	return time.perf_counter() - start
+
+
+def run_generator(name, n_scale, nn_scale, workers):
+	module = modules[name] = load_generator(name)
+	if hasattr(module, 'nn'):
+		module.nn = max(2, round(module.nn * nn_scale))
+	test_cases = [scale_case(params, n_scale) for params in module.test_cases]
+	start = time.perf_counter()
+	with ProcessPoolExecutor(workers, initializer=start_worker, initargs=(name, getattr(module, 'nn', None))) as executor:
+		times = list(ordered_map(executor, partial(timed_case, name), test_cases))
+	total = time.perf_counter() - start
+	return {
+		'total': total,
+		'cases': [{'case': describe_case(params), 'time': t} for params, t in zip(test_cases, times)],
+		'workers': workers,
+		'utilization': sum(times) / (total * workers),
+		'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+		'worker_peak_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+	}
+
+
+def run_all(names, n_scale, nn_scale, workers):
+	# every generator runs in a fresh interpreter, so that its mp.dps and peak RSS are its own
+	results = {}
+	for name in names:
+		command = [sys.executable, os.path.abspath(__file__), '--run', name, '--n-scale', str(n_scale), '--nn-scale', str(nn_scale), '-j', str(workers)]
+		results[name] = json.loads(subprocess.check_output(command))
+		print(f'{name}: {results[name]["total"]:.3f} s, {results[name]["utilization"]:.0%} worker utilization, {results[name]["peak_rss_kb"]} KB peak RSS', file=sys.stderr, flush=True)
+	return {
+		'settings': {'n_scale': n_scale, 'nn_scale': nn_scale, 'workers': workers},
+		'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+		'generators': results,
+	}
+
+
+def compare(baseline, current, threshold, min_time):
+	regressions = []
+	if baseline['settings'] != current['settings']:
+		print(f'warning: baseline settings {baseline["settings"]} differ from {current["settings"]}', file=sys.stderr)
+	for name, result in current['generators'].items():
+		if name not in baseline['generators']:
+			continue
+		base = baseline['generators'][name]
+		if result['total'] > base['total'] * (1 + threshold) and result['total'] - base['total'] > min_time:
+			regressions.append(f'{name}: total {base["total"]:.3f} s -> {result["total"]:.3f} s')
+		base_cases = {case['case']: case['time'] for case in base['cases']}
+		for case in result['cases']:
+			t = base_cases.get(case['case'])
+			if t is not None and case['time'] > t * (1 + threshold) and case['time'] - t > min_time:
+				regressions.append(f'{name} [{case["case"]}]: {t:.3f} s -> {case["time"]:.3f} s')
+	return regressions
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('generators', nargs='*', help=f'Generators to run: {", ".join(generators)} (default: all)')
+	parser.add_argument('-o', '--output', type=str, help='Output JSON file')
+	parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes')
+	parser.add_argument('--n-scale', type=float, default=1, help='Multiply the point count n of every test case')
+	parser.add_argument('--nn-scale', type=float, default=1, help='Multiply the evaluation grid size nn')
+	parser.add_argument('--compare', type=str, help='Baseline JSON file to check for regressions')
+	parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown reported as a regression')
+	parser.add_argument('--min-time', type=float, default=0.01, help='Ignore slowdowns smaller than this many seconds')
+	parser.add_argument('--run', type=str, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	unknown = [name for name in args.generators if name not in generators]
+	if unknown:
+		parser.error(f'unknown generators: {", ".join(unknown)} (choose from {", ".join(generators)})')
+	if args.run:
+		json.dump(run_generator(args.run, args.n_scale, args.nn_scale, args.jobs), sys.stdout)
+		return
+	results = run_all(args.generators or list(generators), args.n_scale, args.nn_scale, args.jobs)
+	output = json.dumps(results, indent='\t')
+	if not args.output:
+		print(output)
+	else:
+		with open(args.output, 'w') as file:
+			file.write(output)
+	if args.compare:
+		with open(args.compare) as file:
+			regressions = compare(json.load(file), results, args.threshold, args.min_time)
+		for regression in regressions:
+			print(f'regression: {regression}', file=sys.stderr)
+		sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
@@ -0,0 +1,79 @@
+# Adaptive working precision: every test case is computed at increasing mp.dps until two successive
+# precisions give the same float64 arrays, instead of at the generator's fixed mp.dps. This checks that the output is
+# stable; it does not make generation faster, as every test case is computed at least twice, at start_dps and twice that.
+# The formatted text is not compared: its 17 digits go beyond float64 and may differ in the last one between
+# precisions. This is an agreement test, not a proof: a result that is wrong in the same way at both precisions is accepted.
+import collections
+import contextlib
+from functools import partial
+import json
+import sys
+from mpmath import mp
+from common.profiling import describe_case
+
+enabled = False
+# 17 significant digits plus 3 guard digits
+start_dps = 20
+max_dps = 1280
+
+
+def float64_arrays(result):
+	# the packed arrays of a (text, arrays) result, or of a list of them
+	if isinstance(result, list):
+		return [float64_arrays(r) for r in result]
+	text, arrays = result
+	return arrays
+
+
+def run_adaptive(function, params):
+	# runs in the worker; returns the result and the lowest precision that reproduced it at twice the digits
+	dps = start_dps
+	with mp.workdps(dps):
+		result = function(params)
+	while dps < max_dps:
+		with mp.workdps(2 * dps):
+			next_result = function(params)
+		if float64_arrays(next_result) == float64_arrays(result):
+			return next_result, dps
+		dps, result = 2 * dps, next_result
+	raise ArithmeticError(f'Test case {describe_case(params)} is not stable up to {max_dps} digits')
+
+
+class AdaptivePrecision:
+	def __init__(self, log=None, file=sys.stderr):
+		self.log = log
+		self.file = file
+		self.cases = []
+
+	def map(self, map_function):
+		def adaptive_map(function, params):
+			params = list(params)
+			for p, (result, dps) in zip(params, map_function(partial(run_adaptive, function), params)):
+				self.cases.append((describe_case(p), dps))
+				yield result
+		return adaptive_map
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		global enabled
+		enabled = False
+		if exc[0] is not None:
+			return
+		counts = collections.Counter(dps for _, dps in self.cases)
+		print(f'{len(self.cases)} test cases computed (not counting cached ones); precision needed: ' + (', '.join(f'{count} at {dps} digits' for dps, count in sorted(counts.items())) or 'none'), file=self.file)
+		if self.log:
+			with open(self.log, 'w') as file:
+				json.dump([{'case': case, 'dps': dps} for case, dps in self.cases], file, indent='\t')
+
+
+def open_adaptive(adaptive, log=None):
+	# also marks the mode for the cache keys, like formatting.set_mode
+	global enabled
+	enabled = bool(adaptive)
+	return AdaptivePrecision(log) if adaptive else contextlib.nullcontext()
+
+
+def adaptive_map(map_function, adaptive):
+	return adaptive.map(map_function) if adaptive else map_function
\ No newline at end of file
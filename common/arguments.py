@@ -0,0 +1,33 @@
+from mpmath import mp
+from common.cache import default_path
+from common.formatting import modes
+from common.queries import kinds
+
+
+def add_common_arguments(parser, name, precision, shards='(func, dist)'):
+	# the options of every generator; shards names what each file of --shards holds
+	parser.add_argument('-o', '--output', type=str, help='Output file')
+	parser.add_argument('-b', '--binary', type=str, help='Also write the arrays to a binary sidecar file')
+	parser.add_argument('--number-format', choices=modes, default='decimal', help=f'Write numbers with {precision} significant digits or as the shortest strings that round-trip to float64')
+	parser.add_argument('--cache', nargs='?', const=default_path, help='Reuse test cases from an on-disk cache (default: %(const)s)')
+	parser.add_argument('--adaptive-precision', action='store_true', help=f'Check that every test case is stable by computing it at increasing precision until its float64 output agrees, instead of once at mp.dps = {mp.dps}; this is slower')
+	parser.add_argument('--precision-log', type=str, help='With --adaptive-precision, write the precision used by each test case to this JSON file')
+	parser.add_argument('--shards', type=str, metavar='DIR', help=f'Write one file per {shards} to DIR, indexed by {name}.manifest.json, instead of a single file')
+	parser.add_argument('--profile', action='store_true', help='Profile every test case where it runs and print the merged report to stderr')
+	parser.add_argument('--trace-memory', action='store_true', help='Trace the memory allocations of every test case and print them to stderr')
+
+
+def add_grid_arguments(parser, grid_nn):
+	parser.add_argument('--grid', type=str, metavar='DIR', help='Evaluate every test case on a uniform grid of --grid-nn points, streamed in chunks to one binary file per test case in DIR, instead of the dataset')
+	parser.add_argument('--grid-nn', type=int, default=grid_nn, help='Number of points of the --grid evaluation grid (default: %(default)s)')
+
+
+def add_stress_arguments(parser, point_counts, nn, note=''):
+	parser.add_argument('--stress', type=str, metavar='DIR', help=f'Write the large-n stress profile to DIR, one shard per test case, instead of the dataset{note}')
+	parser.add_argument('--stress-n', type=int, nargs='+', default=point_counts, help='Point counts of the stress profile (default: %(default)s)')
+	parser.add_argument('--stress-nn', type=int, default=nn, help='Number of evaluation points of the stress profile (default: %(default)s)')
+
+
+def add_query_arguments(parser, query_nn):
+	parser.add_argument('--queries', nargs='+', choices=kinds, help='Evaluate at unsorted query points of these kinds instead of the uniform grid')
+	parser.add_argument('--query-nn', type=int, default=query_nn, help='Number of query points per kind (default: %(default)s)')
\ No newline at end of file
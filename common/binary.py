@@ -0,0 +1,96 @@
+# Binary sidecar layout (all integers and floats little-endian):
+#   header:  8-byte magic b'ALFIDATA', uint32 version, uint32 reserved
+#   data:    the float64 arrays of every case, in the same order as the TOML file
+#   footer:  n_fields 16-byte NUL-padded ASCII field names,
+#            then (uint64 byte offset, uint64 element count) for every case and field
+#   trailer: uint64 footer offset, uint32 n_cases, uint32 n_fields
+# The footer comes last so the file can be written to a pipe; readers start from the trailer.
+import contextlib
+import mmap
+import struct
+import sys
+from mpmath import mp
+from mpmath.libmp import to_float
+
+magic = b'ALFIDATA'
+version = 1
+header = struct.Struct('<8sII')
+index_entry = struct.Struct('<QQ')
+trailer = struct.Struct('<QII')
+
+
+def to_float64(number, zero_threshold):
+	number = mp.mpf(number)
+	return 0.0 if abs(number) < zero_threshold else to_float(number._mpf_, rnd='n')
+
+
+def pack_array(array, zero_threshold):
+	return struct.pack(f'<{len(array)}d', *(to_float64(x, zero_threshold) for x in array))
+
+
+class BinaryWriter:
+	def __init__(self, path, fields):
+		self.file = open(path, 'wb')
+		self.fields = fields
+		self.index = []
+		self.offset = self.file.write(header.pack(magic, version, 0))
+
+	def write_case(self, arrays):
+		if len(arrays) != len(self.fields):
+			raise ValueError(f'Expected {len(self.fields)} arrays, got {len(arrays)}')
+		for array in arrays:
+			self.index.append(index_entry.pack(self.offset, len(array) // 8))
+			self.offset += self.file.write(array)
+
+	def write_chunked_case(self, arrays):
+		# like write_case, but every array is an iterable of packed chunks, consumed one at a time
+		if len(arrays) != len(self.fields):
+			raise ValueError(f'Expected {len(self.fields)} arrays, got {len(arrays)}')
+		for chunks in arrays:
+			start = self.offset
+			for chunk in chunks:
+				self.offset += self.file.write(chunk)
+			self.index.append(index_entry.pack(start, (self.offset - start) // 8))
+
+	def close(self):
+		self.file.write(b''.join(field.encode().ljust(16, b'\0') for field in self.fields))
+		self.file.write(b''.join(self.index))
+		self.file.write(trailer.pack(self.offset, len(self.index) // len(self.fields), len(self.fields)))
+		self.file.close()
+
+
+def open_binary(path, fields):
+	return contextlib.closing(BinaryWriter(path, fields)) if path else contextlib.nullcontext()
+
+
+def split_binary(writer, cases):
+	# passes the text of each (text, arrays) case through, writing the arrays if there is a writer
+	for text, arrays in cases:
+		if writer:
+			writer.write_case(arrays)
+		yield text
+
+
+def parse_binary(buffer):
+	# returns the field names and, per case, a dict of float64 arrays; views into `buffer` on little-endian hosts
+	buffer = memoryview(buffer)
+	file_magic, file_version, _ = header.unpack_from(buffer)
+	if file_magic != magic or file_version != version:
+		raise ValueError(f'Not a version {version} binary sidecar')
+	footer_offset, n_cases, n_fields = trailer.unpack_from(buffer, len(buffer) - trailer.size)
+	fields = [bytes(buffer[footer_offset + 16*i:footer_offset + 16*(i+1)]).rstrip(b'\0').decode() for i in range(n_fields)]
+	index_offset = footer_offset + 16 * n_fields
+	cases = []
+	for i in range(n_cases):
+		case = {}
+		for j, field in enumerate(fields):
+			offset, count = index_entry.unpack_from(buffer, index_offset + index_entry.size * (i * n_fields + j))
+			data = buffer[offset:offset + 8 * count]
+			case[field] = data.cast('d') if sys.byteorder == 'little' else struct.unpack(f'<{count}d', data)
+		cases.append(case)
+	return fields, cases
+
+
+def read_binary(path):
+	with open(path, 'rb') as file:
+		return parse_binary(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
\ No newline at end of file
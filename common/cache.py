@@ -0,0 +1,153 @@
+import contextlib
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import time
+import types
+from mpmath import mp
+from common import adaptive, formatting
+
+default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'test_cases.sqlite')
+default_max_size = 256 << 20
+
+
+def code_names(code):
+	names = set(code.co_names)
+	for const in code.co_consts:
+		if isinstance(const, types.CodeType):
+			names |= code_names(const)
+	return names
+
+
+def methods(cls):
+	# the functions defined in a class body, unwrapped from staticmethod, classmethod and property
+	for value in vars(cls).values():
+		if isinstance(value, (staticmethod, classmethod)):
+			value = value.__func__
+		elif isinstance(value, property):
+			yield from (f for f in (value.fget, value.fset, value.fdel) if f)
+			continue
+		if inspect.isfunction(value):
+			yield value
+
+
+@functools.cache
+def source_closure(function):
+	# source of the function and of every module-level function, class, constant or module it reaches, in its module
+	# or in common, following the methods of classes and the contents of modules in turn; the parts of the function's
+	# own module are not named with it, as it is __main__ when a generator runs as a script
+	parts = {}
+	def label(module, name):
+		return name if module == function.__module__ else f'{module}.{name}'
+	def name(value):
+		return value.__name__ if inspect.ismodule(value) else label(value.__module__, value.__qualname__)
+	def reached(value):
+		module = value.__name__ if inspect.ismodule(value) else getattr(value, '__module__', None)
+		return module is not None and (module == function.__module__ or module.startswith('common.'))
+	stack = [function]
+	while stack:
+		value = stack.pop()
+		if not inspect.ismodule(value):
+			value = inspect.unwrap(value)
+		if name(value) in parts:
+			continue
+		parts[name(value)] = inspect.getsource(value)
+		if inspect.ismodule(value):
+			scopes = [(vars(value), sorted(vars(value)))]
+		else:
+			scopes = [(f.__globals__, sorted(code_names(f.__code__))) for f in (methods(value) if inspect.isclass(value) else [value])]
+		for namespace, names in scopes:
+			for key in names:
+				if key not in namespace or key.startswith('__'):
+					continue
+				found = namespace[key]
+				if inspect.isfunction(found) or inspect.isclass(found) or inspect.ismodule(found):
+					if reached(found):
+						stack.append(found)
+				elif not inspect.ismodule(value) and isinstance(found, (int, float, str, mp.mpf, list, tuple)):
+					parts[label(namespace['__name__'], key)] = f'{key} = {describe(found)}'
+	return '\n'.join(parts[key] for key in sorted(parts))
+
+
+def describe(value):
+	if inspect.isfunction(value):
+		return f'{value.__name__}:{source_closure(value)}'
+	if isinstance(value, (list, tuple)):
+		return '(' + ', '.join(describe(x) for x in value) + ')'
+	if isinstance(value, dict):
+		return '{' + ', '.join(f'{key!r}: {describe(x)}' for key, x in value.items()) + '}'
+	return repr(value)
+
+
+def case_key(function, params):
+	keywords = {}
+	if isinstance(function, functools.partial):
+		function, keywords = function.func, function.keywords
+	settings = [mp.dps, function.__globals__.get('precision'), function.__globals__.get('zero_threshold'), formatting.mode, adaptive.enabled]
+	text = '\n'.join([describe(function), describe(keywords), describe(params), describe(settings)])
+	return hashlib.sha256(text.encode()).hexdigest()
+
+
+class CaseCache:
+	def __init__(self, path=default_path, max_size=default_max_size):
+		os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+		self.max_size = max_size
+		# imported here, so that runs without --cache do not load sqlite3
+		import sqlite3
+		self.connection = sqlite3.connect(path)
+		self.connection.execute('CREATE TABLE IF NOT EXISTS test_cases (key TEXT PRIMARY KEY, value BLOB, size INTEGER, used REAL)')
+
+	def contains(self, key):
+		return self.connection.execute('SELECT 1 FROM test_cases WHERE key = ?', (key,)).fetchone() is not None
+
+	def get(self, key):
+		row = self.connection.execute('SELECT value FROM test_cases WHERE key = ?', (key,)).fetchone()
+		if row is None:
+			return None
+		self.connection.execute('UPDATE test_cases SET used = ? WHERE key = ?', (time.time(), key))
+		return pickle.loads(row[0])
+
+	def put(self, key, value):
+		value = pickle.dumps(value)
+		self.connection.execute('INSERT OR REPLACE INTO test_cases VALUES (?, ?, ?, ?)', (key, value, len(value), time.time()))
+
+	def evict(self):
+		total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM test_cases').fetchone()[0]
+		for key, size in self.connection.execute('SELECT key, size FROM test_cases ORDER BY used').fetchall():
+			if total <= self.max_size:
+				break
+			self.connection.execute('DELETE FROM test_cases WHERE key = ?', (key,))
+			total -= size
+
+	def close(self):
+		self.evict()
+		self.connection.commit()
+		self.connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def open_cache(path):
+	return CaseCache(path) if path else contextlib.nullcontext()
+
+
+def cached_map(map_function, function, params, cache):
+	if cache is None:
+		yield from map_function(function, params)
+		return
+	keys = [case_key(function, p) for p in params]
+	hits = [cache.contains(key) for key in keys]
+	results = map_function(function, [p for p, hit in zip(params, hits) if not hit])
+	for key, hit in zip(keys, hits):
+		if hit:
+			yield cache.get(key)
+		else:
+			result = next(results)
+			cache.put(key, result)
+			yield result
\ No newline at end of file
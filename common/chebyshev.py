@@ -0,0 +1,88 @@
+# Chebyshev series of interpolants on Chebyshev nodes, from the samples by discrete cosine transforms in O(n log n),
+# and their evaluation by the Clenshaw recurrence. The transforms run on a complex FFT of any length, radix 2 for
+# powers of two and Bluestein's chirp convolution otherwise, on fixed-point ints as in common/fixed.py: a complex
+# number is a pair of ints sharing the exponent of the samples, and the roots of unity are scaled by 2^bits.
+# The guard bits cover the O(log n) growth of the FFT's rounding errors.
+from mpmath import mp
+from common.fixed import FixedVector, to_mantissa, to_mpf, working_bits
+
+
+def root_of_unity(numerator, denominator, bits):
+	# e^(i pi numerator / denominator), as a pair of ints scaled by 2^bits
+	with mp.workprec(bits + 16):
+		angle = mp.mpf(numerator) / denominator
+		return to_mantissa(mp.cospi(angle), -bits), to_mantissa(mp.sinpi(angle), -bits)
+
+
+def multiply(x, y, bits):
+	(a, b), (c, d) = x, y
+	return (a*c - b*d) >> bits, (a*d + b*c) >> bits
+
+
+def fft(values, bits, inverse=False):
+	# sum_k values[k] e^(-+2 pi i jk / N) for every j, without the 1/N of the inverse
+	n = len(values)
+	if n <= 1:
+		return list(values)
+	if n & (n - 1):
+		return bluestein(values, bits, inverse)
+	sign = 1 if inverse else -1
+	twiddles = [root_of_unity(sign * 2*k, n, bits) for k in range(n // 2)]
+	order = n.bit_length() - 1
+	result = [values[int(format(k, f'0{order}b')[::-1], 2)] for k in range(n)]
+	size = 2
+	while size <= n:
+		half, step = size // 2, n // size
+		for start in range(0, n, size):
+			for k in range(half):
+				(er, ei), (orr, oi) = result[start + k], multiply(result[start + k + half], twiddles[k * step], bits)
+				result[start + k], result[start + k + half] = (er + orr, ei + oi), (er - orr, ei - oi)
+		size *= 2
+	return result
+
+
+def bluestein(values, bits, inverse=False):
+	# jk = (j^2 + k^2 - (j-k)^2) / 2 turns the transform into a convolution with the chirp e^(+-i pi k^2 / n),
+	# computed by power-of-two FFTs; k^2 is reduced mod 2n to keep the angles small
+	n = len(values)
+	sign = 1 if inverse else -1
+	chirp = [root_of_unity(sign * (k * k % (2*n)), n, bits) for k in range(n)]
+	size = 1 << (2*n - 2).bit_length()
+	conjugate = [(c, -s) for c, s in chirp]
+	a = [multiply(v, c, bits) for v, c in zip(values, chirp)] + [(0, 0)] * (size - n)
+	b = [(c << bits, s << bits) for c, s in conjugate] + [(0, 0)] * (size - 2*n + 1) + [(c << bits, s << bits) for c, s in reversed(conjugate[1:])]
+	# b carries 2^bits more, which the division by size removes along with the 1/size of the inverse
+	convolution = fft([multiply(x, y, bits) for x, y in zip(fft(a, bits), fft(b, bits))], bits, inverse=True)
+	shift = bits + size.bit_length() - 1
+	return [multiply(c, ((x + (1 << (shift - 1))) >> shift, (y + (1 << (shift - 1))) >> shift), bits) for c, (x, y) in zip(chirp, convolution[:n])]
+
+
+def coefficients_first_kind(values):
+	# c_j of sum_j c_j T_j(t) through values[k] at the roots t_k = cos((2k+1) pi / 2n) of T_n:
+	# c_j = 2/n sum_k values[k] cos(j (2k+1) pi / 2n), halved for j = 0, by a DCT-II on the mirrored values
+	n = len(values)
+	bits = working_bits()
+	samples = FixedVector.from_mpf(values, bits)
+	transform = fft([(m, 0) for m in samples.mantissas + samples.mantissas[::-1]], bits)
+	c = [multiply(root_of_unity(-j, 2*n, bits), transform[j], bits)[0] for j in range(n)]
+	return [to_mpf(m, samples.exponent) / (2*n if j == 0 else n) for j, m in enumerate(c)]
+
+
+def coefficients_second_kind(values):
+	# c_j of sum_j c_j T_j(t) through values[k] at the extrema t_k = cos(k pi / (n-1)) of T_(n-1):
+	# c_j = 2/(n-1) sum''_k values[k] cos(jk pi / (n-1)), halved for j = 0 and j = n-1, by a DCT-I on the mirrored values
+	n = len(values)
+	if n == 1:
+		return [+values[0]]
+	bits = working_bits()
+	samples = FixedVector.from_mpf(values, bits)
+	transform = fft([(m, 0) for m in samples.mantissas + samples.mantissas[-2:0:-1]], bits)
+	return [to_mpf(transform[j][0], samples.exponent) / (2*(n - 1) if j in (0, n - 1) else n - 1) for j in range(n)]
+
+
+def clenshaw(coefficients, t):
+	# sum_j coefficients[j] T_j(t)
+	b1, b2 = mp.mpf(0), mp.mpf(0)
+	for c in reversed(coefficients[1:]):
+		b1, b2 = c + 2*t*b1 - b2, b1
+	return coefficients[0] + t*b1 - b2 if coefficients else b1
\ No newline at end of file
@@ -0,0 +1,127 @@
+# Fixed-point vectors: Python ints sharing one binary exponent, value = mantissa * 2**exponent.
+# Elementwise arithmetic works on the ints alone instead of allocating an mpf per element and operation;
+# a vector goes back to mpf, rounded to the working precision, only at the end of a computation.
+# The ints carry guard_bits more than mp.prec, so the rounded results agree with the mpf computations
+# they replace to far more digits than the datasets keep.
+from fractions import Fraction
+from mpmath import mp
+from mpmath.libmp import from_man_exp
+
+guard_bits = 64
+
+
+def working_bits():
+	return mp.prec + guard_bits
+
+
+def to_mantissa(value, exponent):
+	# the mantissa of value at the given exponent, rounded to nearest
+	sign, man, exp, bc = mp.mpf(value)._mpf_
+	if not man and exp:
+		raise ValueError(f'Cannot convert {value} to fixed point')
+	shift = exp - exponent
+	m = man << shift if shift >= 0 else (man + (1 << (-shift - 1))) >> -shift
+	return -m if sign else m
+
+
+def to_mpf(mantissa, exponent, prec=None):
+	return mp.make_mpf(from_man_exp(mantissa, exponent, prec if prec is not None else mp.prec, 'n'))
+
+
+class FixedVector:
+	def __init__(self, mantissas, exponent, bits=None):
+		self.mantissas = mantissas
+		self.exponent = exponent
+		self.bits = bits or working_bits()
+
+	@classmethod
+	def from_mpf(cls, values, bits=None):
+		bits = bits or working_bits()
+		values = [mp.mpf(value) for value in values]
+		top = max((int(mp.mag(value)) for value in values if value), default=0)
+		return cls([to_mantissa(value, top - bits) for value in values], top - bits, bits)
+
+	@classmethod
+	def linspace(cls, start, stop, n, bits=None):
+		# n equally spaced points from start to stop, each rounded once; start and stop are integers
+		bits = bits or working_bits()
+		exponent = max(abs(start), abs(stop)).bit_length() - bits
+		if n == 1:
+			return cls([start << -exponent], exponent, bits)
+		return cls([((start * (n-1-k) + stop * k << -exponent) + (n-1) // 2) // (n-1) for k in range(n)], exponent, bits)
+
+	@classmethod
+	def cosines(cls, start, step, n, bits=None):
+		# cos(pi * (start + k*step)) for k < n, with start and step rationals, by the recurrence
+		# c[k+1] = 2 cos(pi*step) c[k] - c[k-1]; its rounding errors grow at most quadratically in n,
+		# which the guard bits absorb
+		bits = bits or working_bits()
+		start, step = Fraction(start), Fraction(step)
+		with mp.workprec(bits):
+			angles = [mp.mpf(x.numerator) / x.denominator for x in [start, start + step, step]]
+			first, second, factor = (to_mantissa(x, -bits) for x in [mp.cospi(angles[0]), mp.cospi(angles[1]), 2 * mp.cospi(angles[2])])
+		mantissas = [first, second][:n]
+		for _ in range(n - 2):
+			mantissas.append((factor * mantissas[-1] >> bits) - mantissas[-2])
+		return cls(mantissas, -bits, bits)
+
+	def __len__(self):
+		return len(self.mantissas)
+
+	def constant(self, value):
+		return to_mantissa(value, self.exponent)
+
+	def map(self, function):
+		# applies an int -> int function to every mantissa, keeping the exponent
+		return FixedVector([function(m) for m in self.mantissas], self.exponent, self.bits)
+
+	def __neg__(self):
+		return FixedVector([-m for m in self.mantissas], self.exponent, self.bits)
+
+	def __add__(self, other):
+		if isinstance(other, FixedVector):
+			if other.exponent != self.exponent:
+				raise ValueError('Fixed-point vectors with different exponents')
+			return FixedVector([m + o for m, o in zip(self.mantissas, other.mantissas)], self.exponent, self.bits)
+		c = self.constant(other)
+		return FixedVector([m + c for m in self.mantissas], self.exponent, self.bits)
+
+	def __sub__(self, other):
+		return self + (-other)
+
+	def __rsub__(self, other):
+		return -self + other
+
+	def scale(self, factor):
+		# multiplies by an mpf, renormalizing so that the largest mantissa keeps `bits` bits
+		factor = FixedVector.from_mpf([factor], self.bits)
+		f = factor.mantissas[0]
+		products = [m * f for m in self.mantissas]
+		shift = max(abs(p) for p in products).bit_length() - self.bits if products else 0
+		if shift <= 0:
+			return FixedVector(products, self.exponent + factor.exponent, self.bits)
+		half = 1 << (shift - 1)
+		return FixedVector([(p + half) >> shift for p in products], self.exponent + factor.exponent + shift, self.bits)
+
+	def divide(self, other):
+		# elementwise self / other; every quotient keeps at least `bits` bits
+		if not self.mantissas:
+			return FixedVector([], 0, self.bits)
+		shift = self.bits + max(abs(o) for o in other.mantissas).bit_length()
+		return FixedVector([(m << shift) // o for m, o in zip(self.mantissas, other.mantissas)], self.exponent - other.exponent - shift, self.bits)
+
+	def dot(self, other):
+		# the exact sum of products, rounded once
+		return to_mpf(sum(m * o for m, o in zip(self.mantissas, other.mantissas)), self.exponent + other.exponent)
+
+	def sum(self):
+		return to_mpf(sum(self.mantissas), self.exponent)
+
+	def min(self):
+		return to_mpf(min(self.mantissas), self.exponent, 0)
+
+	def max(self):
+		return to_mpf(max(self.mantissas), self.exponent, 0)
+
+	def to_mpf(self):
+		return [to_mpf(m, self.exponent) for m in self.mantissas]
\ No newline at end of file
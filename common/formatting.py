@@ -0,0 +1,78 @@
+import math
+from mpmath import mp
+from mpmath.libmp import mpf_abs, mpf_lt, to_float
+
+# 'decimal' reproduces mp.nstr(x, n=precision).removesuffix('.0') exactly,
+# 'shortest' writes the shortest string that round-trips the correctly rounded float64 value
+modes = ['decimal', 'shortest']
+mode = 'decimal'
+
+log2_10 = math.log(10, 2)
+power_of_ten = {}
+
+
+def set_mode(value):
+	global mode
+	if value not in modes:
+		raise ValueError(f'Unexpected number format: {value!r}')
+	mode = value
+
+
+def decimal_string(sign, man, exp, bc, dps, bitprec):
+	# mpmath.libmp.to_str(s, dps) with its default fixed-point range, without the trailing '.0';
+	# the digits are those of mpmath.libmp.to_digits_exp(s, dps + 3), computed with the same integer steps
+	fixprec = max(bitprec - exp - bc, 0)
+	fixdps = int(fixprec / log2_10 + 0.5)
+	offset = exp + fixprec
+	fixed = man << offset if offset >= 0 else man >> -offset
+	if fixdps not in power_of_ten:
+		power_of_ten[fixdps] = 10**fixdps
+	digits = str(fixed * power_of_ten[fixdps] >> fixprec)
+	exponent = len(digits) - fixdps - 1
+	if len(digits) > dps:
+		if digits[dps] >= '5':
+			digits = str(int(digits[:dps]) + 1)
+			if len(digits) > dps:
+				exponent += 1
+		digits = digits[:dps]
+	digits = digits.rstrip('0')
+	if min(-(dps//3), -5) < exponent < dps:
+		if exponent < 0:
+			digits = '0.' + '0' * (-exponent - 1) + digits
+		elif exponent + 1 >= len(digits):
+			digits += '0' * (exponent + 1 - len(digits))
+		else:
+			digits = digits[:exponent+1] + '.' + digits[exponent+1:]
+	else:
+		digits = digits[0] + '.' + (digits[1:] or '0') + ('e+' if exponent > 0 else 'e') + str(exponent)
+	return '-' + digits if sign else digits
+
+
+def to_decimals(array, precision, zero_threshold):
+	threshold = mp.mpf(zero_threshold)._mpf_
+	threshold_magnitude = threshold[2] + threshold[3]
+	shortest = mode == 'shortest'
+	bitprec = int((precision + 3) * log2_10) + 10
+	result = []
+	for number in array:
+		s = getattr(number, '_mpf_', None)
+		if s is None:
+			result.append(mp.nstr(number, n=precision).removesuffix('.0') if abs(number) >= zero_threshold else '0')
+			continue
+		sign, man, exp, bc = s
+		magnitude = exp + bc
+		if not man and exp:
+			result.append(mp.nstr(number, n=precision))
+		elif not man or magnitude < threshold_magnitude or (magnitude == threshold_magnitude and mpf_lt(mpf_abs(s), threshold)):
+			result.append('0')
+		elif shortest:
+			result.append(repr(to_float(s, rnd='n')).removesuffix('.0'))
+		elif abs(magnitude) > 3500:
+			result.append(mp.nstr(number, n=precision).removesuffix('.0'))
+		else:
+			result.append(decimal_string(sign, man, exp, bc, precision, bitprec))
+	return result
+
+
+def to_decimal(number, precision, zero_threshold):
+	return to_decimals([number], precision, zero_threshold)[0]
\ No newline at end of file
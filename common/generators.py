@@ -0,0 +1,29 @@
+import importlib.util
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name: (generator script, dataset, binary sidecar), relative to the repository root
+generators = {
+	'dist': ('dist/generate.py', 'dist/dist.toml', 'dist/dist.bin'),
+	'poly': ('poly/generate.py', 'poly/poly.toml', 'poly/poly.bin'),
+	'barycentric': ('misc/generate.py', 'misc/barycentric.toml', 'misc/barycentric.bin'),
+	'step': ('spline/generate_step.py', 'spline/step.toml', 'spline/step.bin'),
+	'linear': ('spline/generate_linear.py', 'spline/linear.toml', 'spline/linear.bin'),
+	'quadratic': ('spline/generate_quadratic.py', 'spline/quadratic.toml', 'spline/quadratic.bin'),
+	'cubic': ('spline/generate_cubic.py', 'spline/cubic.toml', 'spline/cubic.bin'),
+}
+
+
+def module_name(name):
+	return f'{name}_generator'
+
+
+def load_generator(name):
+	# imports the generator script as a module; note that this sets the global mp.dps to the generator's
+	spec = importlib.util.spec_from_file_location(module_name(name), os.path.join(root, generators[name][0]))
+	module = importlib.util.module_from_spec(spec)
+	sys.modules[spec.name] = module
+	spec.loader.exec_module(module)
+	return module
\ No newline at end of file
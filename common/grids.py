@@ -0,0 +1,52 @@
+import contextlib
+from functools import partial
+from mpmath import mp
+import os
+from common.binary import BinaryWriter, pack_array
+from common.profiling import file_name, profiled_map
+from common.stream import open_pool
+
+# evaluation points per chunk; a chunk of xx and its yy are the only arrays whose size depends on nn
+chunk_size = 1 << 14
+
+
+def grid_chunk(a, b, nn, start, stop):
+	# points start, ..., stop-1 of stretched(uniform(nn), a, b), rounded the same way
+	if nn == 1:
+		return [(a+b)/2]
+	lo, hi = mp.mpf(-1), mp.mpf(1)
+	return [a + (2 * mp.mpf(k) / (nn-1) - 1 - lo) * (b-a) / (hi-lo) for k in range(start, stop)]
+
+
+def grid_chunks(a, b, nn):
+	for start in range(0, nn, chunk_size):
+		yield grid_chunk(a, b, nn, start, min(start + chunk_size, nn))
+
+
+def write_grid(path, fields, arrays, interpolate, a, b, nn, zero_threshold):
+	# writes the arrays, then xx and yy on a uniform grid of nn points, to the binary file path, a chunk at a time;
+	# the grid is computed a second time for yy rather than kept, so memory does not grow with nn
+	with contextlib.closing(BinaryWriter(path, fields)) as writer:
+		writer.write_chunked_case([[pack_array(array, zero_threshold)] for array in arrays] + [
+			(pack_array(xx, zero_threshold) for xx in grid_chunks(a, b, nn)),
+			(pack_array(interpolate(xx), zero_threshold) for xx in grid_chunks(a, b, nn)),
+		])
+
+
+def write_grid_case(params, grid_case, fields, directory, nn, zero_threshold):
+	# grid_case(params) gives the arrays of the test case before xx and yy, and its interpolant of a chunk of xx;
+	# the interval (a, b) is the last two parameters of every test case
+	arrays, interpolate = grid_case(params)
+	a, b = params[-2:]
+	path = os.path.join(directory, file_name(params) + '.bin')
+	write_grid(path, fields, arrays, interpolate, a, b, nn, zero_threshold)
+	return path
+
+
+def generate_grid_cases(cases, grid_case, fields, directory, nn, zero_threshold, profiler=None, map_function=None):
+	# the test cases evaluated on a uniform grid of nn points; every worker streams its test case to a binary file
+	# a chunk at a time, so memory does not grow with nn, and only file names come back
+	os.makedirs(directory, exist_ok=True)
+	write_case = partial(write_grid_case, grid_case=grid_case, fields=fields, directory=directory, nn=nn, zero_threshold=zero_threshold)
+	with open_pool(map_function) as map_function:
+		yield from profiled_map(map_function, profiler)(write_case, cases)
\ No newline at end of file
@@ -0,0 +1,138 @@
+# Sums of the form sum_k q_k / (x - x_k) at many targets x, for several charge vectors q on the same sources,
+# by a one-dimensional fast multipole method: O((n + nn) p + cells p^2) work instead of O(n nn).
+#
+# The interval holding the sources and targets is halved `depth` times. Every cell of half-width r and center c
+# carries the moments mu_m = sum q_k ((x_k - c) / r)^m of its sources (m < p), and a local expansion
+# (1/r) sum_j lambda_j ((x - c) / r)^j of the field of the well-separated sources, which are at least one cell apart
+# on the same level. Sources in a target's leaf and its two neighbours (the near field) are summed directly, with
+# the exact sum of the rounded quotients as in common/fixed.py.
+#
+# Error bound: a source y and a target x in well-separated cells with centers D apart satisfy 2r / |D| <= 1/2 and
+# |D| - 2r >= |x - y| / 3, so truncating both expansions below degree p leaves at most
+# |q| (2r / |D|)^p / (|D| - 2r) <= 3 * 2^-p |q| / |x - y| per source. With p = mp.prec + 2, the far field is accurate to
+# 2^-mp.prec times sum_k |q_k / (x - x_k)|, the rounding error of the direct sum. The expansions are computed on
+# ints carrying guard_bits more than mp.prec, which keeps their own rounding well below that.
+from functools import lru_cache
+from math import comb
+from operator import mul
+from mpmath import mp
+from common.fixed import FixedVector, to_mantissa, to_mpf, working_bits
+
+def expansion_order():
+	return mp.prec + 2
+
+
+def round_shift(value, shift):
+	return (value + (1 << (shift - 1))) >> shift if shift > 0 else value << -shift
+
+
+def round_divide(a, b):
+	if b < 0:
+		a, b = -a, -b
+	return (2*a + b) // (2*b)
+
+
+@lru_cache(maxsize=None)
+def translations(p, bits):
+	# multipole to multipole, from a child whose center is e = -1 (left) or 1 (right) child half-widths from its
+	# parent's: mu'_m = 2^-m sum_i binom(m, i) e^(m-i) mu_i
+	up = {e: [[comb(m, i) * e**(m - i) for i in range(m + 1)] for m in range(p)] for e in (-1, 1)}
+	# local to local, the other way: lambda'_i = 1/2 sum_j 2^-j binom(j, i) e^(j-i) lambda_j, the 2^-j kept as
+	# 2^(p-j) until a single final shift
+	down = {e: [[comb(j, i) * e**(j - i) << (p - j) for j in range(i, p)] for i in range(p)] for e in (-1, 1)}
+	# multipole to local between cells k cell widths apart: lambda_j = sum_m binom(m+j, j) (-1)^j / (2k)^(m+j+1) mu_m,
+	# rounded to `bits` bits
+	across = {}
+	for k in (-3, -2, 2, 3):
+		rows = [[round_divide(comb(m + j, j) * (-1)**j << bits, (2*k)**(m + j + 1)) for m in range(p)] for j in range(p)]
+		# the entries fall below 2^-bits for large m + j; dot stops at the shorter of a row and the moments
+		across[k] = [row[:max((m + 1 for m, entry in enumerate(row) if entry), default=0)] for row in rows]
+	return up, down, across
+
+
+def dot(row, values):
+	return sum(map(mul, row, values))
+
+
+class Tree:
+	def __init__(self, points, depth):
+		self.depth = depth
+		self.leaves = 1 << depth
+		bits = working_bits()
+		with mp.workprec(bits):
+			self.lo = min(points)
+			self.width = max(points) - self.lo
+			# half-width of the leaves
+			self.radius = self.width / (2 * self.leaves)
+
+	def locate(self, x):
+		# the leaf of x and its coordinate (x - c) / r in that leaf, as an int scaled by 2^bits
+		bits = working_bits()
+		with mp.workprec(bits):
+			u = (x - self.lo) * self.leaves / self.width
+			leaf = min(max(int(mp.floor(u)), 0), self.leaves - 1)
+			return leaf, to_mantissa(2 * (u - leaf) - 1, -bits)
+
+
+def cauchy_sums(sources, charges, targets, depth=None):
+	# for every charge vector q, sum_k q[k] / (x - sources[k]) at every target x; no target may be a source
+	p, bits = expansion_order(), working_bits()
+	up, down, across = translations(p, bits)
+	if depth is None:
+		# about p points per leaf, which balances the near field of a leaf against its p^2 translations
+		depth = max(2, (max(len(sources), len(targets)) // p).bit_length())
+	tree = Tree(list(sources) + list(targets), depth)
+	charges = [FixedVector.from_mpf(q) for q in charges]
+	located = [tree.locate(x) for x in sources]
+	by_leaf = [[] for _ in range(tree.leaves)]
+	for k, (leaf, _) in enumerate(located):
+		by_leaf[leaf].append(k)
+
+	# moments of the leaves, then of their ancestors down to level 2; levels 0 and 1 have no well-separated cells
+	moments = [None] * (depth + 1)
+	moments[depth] = [[[0] * p for _ in range(tree.leaves)] for _ in charges]
+	for q, leaf_moments in zip(charges, moments[depth]):
+		for k, (leaf, sigma) in enumerate(located):
+			mu = leaf_moments[leaf]
+			term = q.mantissas[k]
+			for m in range(p):
+				mu[m] += term
+				term = term * sigma >> bits
+	for level in reversed(range(2, depth)):
+		moments[level] = [[[round_shift(dot(up[-1][m], left[:m+1]) + dot(up[1][m], right[:m+1]), m) for m in range(p)]
+			for left, right in zip(cell_moments[0::2], cell_moments[1::2])] for cell_moments in moments[level + 1]]
+
+	# local expansions: from the parent, then from the well-separated children of the parent's neighbours
+	local = [[[0] * p for _ in range(1 << 2)] for _ in charges]
+	for level in range(2, depth + 1):
+		cells = 1 << level
+		if level > 2:
+			local = [[[round_shift(dot(down[-1 if i % 2 == 0 else 1][j], parent[i // 2][j:]), p + 1) for j in range(p)]
+				for i in range(cells)] for parent in local]
+		for q_local, q_moments in zip(local, moments[level]):
+			for i in range(cells):
+				for s in range(max(2 * (i // 2 - 1), 0), min(2 * (i // 2 + 1) + 2, cells)):
+					if abs(i - s) >= 2:
+						matrix = across[i - s]
+						lam = q_local[i]
+						for j in range(p):
+							lam[j] += round_shift(dot(matrix[j], q_moments[s]), bits)
+
+	# near field of every leaf: its sources and those of its neighbours
+	near = []
+	for leaf in range(tree.leaves):
+		indices = [k for l in range(max(leaf - 1, 0), min(leaf + 2, tree.leaves)) for k in by_leaf[l]]
+		near.append((FixedVector.from_mpf([sources[k] for k in indices]), [FixedVector([q.mantissas[k] for k in indices], q.exponent, q.bits) for q in charges]))
+	results = [[] for _ in charges]
+	for x in targets:
+		leaf, tau = tree.locate(x)
+		X_near, q_near = near[leaf]
+		inverse = FixedVector([1 << bits] * len(X_near), -bits, bits).divide(x - X_near) if len(X_near) else None
+		for q, q_local, q_near_values, result in zip(charges, local, q_near, results):
+			acc = 0
+			for coefficient in reversed(q_local[leaf]):
+				acc = (acc * tau >> bits) + coefficient
+			with mp.workprec(bits):
+				far = to_mpf(acc, q.exponent, bits) / tree.radius
+			result.append(far + inverse.dot(q_near_values) if inverse else +far)
+	return results
\ No newline at end of file
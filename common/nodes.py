@@ -0,0 +1,30 @@
+# The sampled functions and node sets shared by poly, barycentric and the splines
+from mpmath import mp
+
+
+def exp(x):
+	return mp.exp(x)
+def sin(x):
+	return mp.sin(x)
+def cos(x):
+	return mp.cos(x)
+def f1(x):
+	return mp.fabs(x) + x/2 - x*x
+def f2(x):
+	return -3*mp.sin(10*x) + 10*mp.sin(mp.fabs(x) + x/2)
+
+def uniform(n):
+	return [mp.mpf(0)] if n == 1 else [2 * mp.mpf(k) / (n-1) - 1 for k in range(n)]
+def chebyshev(n):
+	return [-mp.cos((2*k - 1) * mp.pi / (2*n)) for k in range(1, n + 1)]
+def chebyshev_2(n):
+	return [mp.sin(mp.pi / 2 * x) for x in uniform(n)]
+
+
+def stretched(points, a, b):
+	if not points:
+		return []
+	if len(points) == 1 or min(points) == max(points):
+		return [(a+b)/2] * len(points)
+	lo, hi = min(points), max(points)
+	return [a + (p-lo) * (b-a) / (hi-lo) for p in points]
\ No newline at end of file
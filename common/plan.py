@@ -0,0 +1,111 @@
+# Intermediates shared by test cases: node sets, function samples and evaluation grids. The generators ask for them
+# through the functions below. A planned map computes every distinct intermediate its test cases need once per
+# precision, dependencies first, in the pool, and hands each test case the ones it uses; outside of a plan, an
+# intermediate is computed where it is asked for.
+from functools import partial, wraps
+from mpmath import mp
+from common.nodes import stretched, uniform
+
+# key -> value in a worker running a planned test case or intermediate
+intermediates = None
+
+
+def key(function, args):
+	# the module keeps apart the intermediates of generators sharing a pool
+	return (function.__module__, function.__name__, args, mp.prec)
+
+
+def intermediate(depends=None):
+	# depends(*args): the (intermediate, args) the intermediate itself asks for
+	def decorator(function):
+		@wraps(function)
+		def wrapper(*args):
+			if intermediates is not None and key(wrapper, args) in intermediates:
+				return intermediates[key(wrapper, args)]
+			return function(*args)
+		wrapper.depends = depends or (lambda *args: [])
+		return wrapper
+	return decorator
+
+
+@intermediate()
+def nodes(dist, n, a, b):
+	return stretched(dist(n), a, b)
+
+
+@intermediate(depends=lambda func, dist, n, a, b: [(nodes, (dist, n, a, b))])
+def samples(func, dist, n, a, b):
+	X = nodes(dist, n, a, b)
+	return X, [func(x) for x in X]
+
+
+@intermediate()
+def evaluation_grid(nn, a, b):
+	return stretched(uniform(nn), a, b)
+
+
+def case_requirements(names, nn=None):
+	# the intermediates of a test case with these parameters: its function samples and, with nn, its evaluation grid
+	def requirements(params):
+		p = dict(zip(names, params))
+		return [(samples, (p['func'], p['dist'], p['n'], p['a'], p['b']))] + ([(evaluation_grid, (nn, p['a'], p['b']))] if nn else [])
+	return requirements
+
+
+def batch_requirements(names, functions, nn=None):
+	# the intermediates of a batch of test cases that differ only in their function, named by every parameter but func
+	requirements = case_requirements(['func'] + names, nn)
+	def batch(params):
+		return list(dict.fromkeys(need for func in functions for need in requirements((func,) + params)))
+	return batch
+
+
+def levels(needs):
+	# the distinct intermediates with everything they depend on, in groups that only depend on earlier groups
+	depth = {}
+	def visit(need):
+		if need not in depth:
+			depth[need] = 1 + max((visit(dependency) for dependency in need[0].depends(*need[1])), default=-1)
+		return depth[need]
+	for need in needs:
+		visit(need)
+	return [[need for need in depth if depth[need] == level] for level in range(max(depth.values(), default=-1) + 1)]
+
+
+def evaluate(need):
+	function, args = need
+	return function(*args)
+
+
+def provided(function, case):
+	# runs in the worker: function(params) with the intermediates the plan computed for it
+	global intermediates
+	params, values = case
+	intermediates = values
+	try:
+		return function(params)
+	finally:
+		intermediates = None
+
+
+def compute_intermediates(map_function, needs):
+	# need -> value for every need and its dependencies, each computed once
+	values = {}
+	for level in levels(needs):
+		cases = [(need, {key(*dependency): values[dependency] for dependency in need[0].depends(*need[1])}) for need in level]
+		values.update(zip(level, map_function(partial(provided, evaluate), cases)))
+	return values
+
+
+def provide(needs, values):
+	return {key(*need): values[need] for need in needs}
+
+
+def planned(map_function, requirements):
+	# a map function that computes the intermediates of its test cases first and passes them along
+	def planned_map(function, params):
+		params = list(params)
+		needs = [requirements(p) for p in params]
+		values = compute_intermediates(map_function, [need for case in needs for need in case])
+		yield from map_function(partial(provided, function), [(p, provide(case, values)) for p, case in zip(params, needs)])
+	return planned_map
\ No newline at end of file
@@ -0,0 +1,148 @@
+import contextlib
+from functools import partial
+import os
+import re
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+limit = 25
+
+
+def describe_case(params):
+	parts = []
+	for value in params:
+		if callable(value):
+			parts.append(value.__name__)
+		elif isinstance(value, dict):
+			parts.extend(f'{key}={value[key]}' for key in value)
+		else:
+			parts.append(str(value))
+	return ' '.join(parts)
+
+
+def file_name(params):
+	# describe_case for the names of the files of single test cases
+	return describe_case(params).replace(' ', '_')
+
+
+def category(filename):
+	# groups profile entries by where the code lives: a file of this repository, an installed package or the standard library
+	if filename == '~':
+		return 'builtins'
+	if filename == '<string>':
+		# the arithmetic operators of mpf are generated with exec
+		return 'mpmath'
+	path = os.path.abspath(filename)
+	if path.startswith(root + os.sep):
+		return os.path.relpath(path, root)
+	match = re.search(r'[/\\](?:site|dist)-packages[/\\]([^/\\.]+)', path)
+	return match.group(1) if match else 'stdlib'
+
+
+def run_case(function, profile, trace_memory, params):
+	# runs in the worker; returns the result with the profile of this case alone
+	# (cProfile, pstats and tracemalloc are imported here and in Profiler, so that runs without --profile do not load them)
+	import cProfile
+	import tracemalloc
+	report = {}
+	profiler = cProfile.Profile() if profile else None
+	if trace_memory:
+		tracemalloc.start()
+	start = time.perf_counter()
+	if profiler:
+		profiler.enable()
+	result = function(params)
+	if profiler:
+		profiler.disable()
+	report['time'] = time.perf_counter() - start
+	if trace_memory:
+		report['peak'] = tracemalloc.get_traced_memory()[1]
+		snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, cProfile.__file__), tracemalloc.Filter(False, tracemalloc.__file__)])
+		tracemalloc.stop()
+		report['sites'] = [(str(s.traceback[0]), s.size, s.count) for s in snapshot.statistics('lineno')[:limit]]
+	if profiler:
+		profiler.create_stats()
+		report['stats'] = profiler.stats
+	return result, report
+
+
+class CaseStats:
+	# what pstats.Stats expects of a profiler object
+	def __init__(self, stats):
+		self.stats = stats
+
+	def create_stats(self):
+		pass
+
+
+class Profiler:
+	def __init__(self, profile=True, trace_memory=False, file=sys.stderr):
+		self.profile = profile
+		self.trace_memory = trace_memory
+		self.file = file
+		self.cases = []
+		self.stats = None
+		self.sites = {}
+
+	def map(self, map_function):
+		# wraps a map function like partial(ordered_map, executor) so that every case is profiled where it runs
+		def profiled_map(function, params):
+			params = list(params)
+			for p, (result, report) in zip(params, map_function(partial(run_case, function, self.profile, self.trace_memory), params)):
+				self.add(p, report)
+				yield result
+		return profiled_map
+
+	def add(self, params, report):
+		self.cases.append((describe_case(params), report['time'], report.get('peak')))
+		if 'stats' in report:
+			if self.stats is None:
+				import pstats
+				self.stats = pstats.Stats(CaseStats(report['stats']), stream=self.file)
+			else:
+				self.stats.add(CaseStats(report['stats']))
+		for site, size, count in report.get('sites', []):
+			total_size, total_count = self.sites.get(site, (0, 0))
+			self.sites[site] = (total_size + size, total_count + count)
+
+	def report(self):
+		out = partial(print, file=self.file)
+		total = sum(t for _, t, _ in self.cases)
+		out(f'{len(self.cases)} test cases profiled, {total:.3f} s in total (not counting cached ones)')
+		out()
+		out('Slowest test cases:')
+		out(f'{"time (s)":>10} {"share":>6}' + (f' {"peak (KB)":>10}' if self.trace_memory else '') + '  case')
+		for case, t, peak in sorted(self.cases, key=lambda case: -case[1])[:limit]:
+			out(f'{t:10.4f} {t / total if total else 0:6.1%}' + (f' {peak // 1024:10}' if self.trace_memory else '') + f'  {case}')
+		if self.stats:
+			out()
+			out('Own time by module:')
+			modules = {}
+			for (filename, _, _), (_, _, tt, _, _) in self.stats.stats.items():
+				modules[category(filename)] = modules.get(category(filename), 0) + tt
+			for module, tt in sorted(modules.items(), key=lambda item: -item[1]):
+				out(f'{tt:10.4f} {tt / self.stats.total_tt if self.stats.total_tt else 0:6.1%}  {module}')
+			out()
+			self.stats.sort_stats('cumulative').print_stats(limit)
+		if self.sites:
+			out('Memory still allocated at the end of each case, summed over cases:')
+			out(f'{"size (KB)":>10} {"blocks":>8}  site')
+			for site, (size, count) in sorted(self.sites.items(), key=lambda item: -item[1][0])[:limit]:
+				out(f'{size // 1024:10} {count:8}  {site}')
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		if exc[0] is None:
+			self.report()
+
+
+def open_profiler(profile, trace_memory, file=sys.stderr):
+	return Profiler(profile, trace_memory, file) if profile or trace_memory else contextlib.nullcontext()
+
+
+def profiled_map(map_function, profiler):
+	return profiler.map(map_function) if profiler else map_function
\ No newline at end of file
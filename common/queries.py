@@ -0,0 +1,50 @@
+import bisect
+from functools import partial
+import random
+from mpmath import mp
+from common.adaptive import adaptive_map
+from common.binary import open_binary, pack_array, split_binary
+from common.cache import cached_map
+from common.profiling import profiled_map
+from common.stream import join, open_pool
+
+kinds = ['random', 'clustered', 'out-of-range', 'on-knot']
+
+
+def segment(X, x):
+	# index of the segment that evaluates x: the last one starting at or before x, clamped to the first and the last one
+	return min(max(bisect.bisect_right(X, x) - 1, 0), len(X) - 2)
+
+
+def query_points(kind, X, a, b, nn, seed):
+	# unsorted query points, reproducible from the seed; apart from the knots they are float64 values,
+	# which the datasets store exactly
+	rng = random.Random(f'{kind} {seed}')
+	width = b - a
+	if kind == 'random':
+		return [mp.mpf(a + width * rng.random()) for _ in range(nn)]
+	elif kind == 'clustered':
+		# within a millionth of the interval on either side of a random knot
+		return [mp.mpf(float(X[rng.randrange(len(X))]) + width * 1e-6 * (2 * rng.random() - 1)) for _ in range(nn)]
+	elif kind == 'out-of-range':
+		return [mp.mpf(a - width * rng.random() if rng.random() < 0.5 else b + width * rng.random()) for _ in range(nn)]
+	elif kind == 'on-knot':
+		return [X[rng.randrange(len(X))] for _ in range(nn)]
+	else:
+		raise ValueError(f'Unexpected query points: {kind!r}')
+
+
+def generate_query_case(params, evaluate, format_test_case, zero_threshold):
+	# params: a test case followed by the kind and the number of query points; format_test_case takes the
+	# parameters of the test case before n, a and b, then the arrays of evaluate
+	*params, queries, nn = params
+	arrays = evaluate(tuple(params), nn, queries)
+	return format_test_case(*params[:-3], *arrays, queries=queries), [pack_array(array, zero_threshold) for array in arrays]
+
+
+def generate_query_cases(cases, queries, nn, evaluate, format_test_case, fields, zero_threshold, requirements=None, cache=None, binary=None, profiler=None, adaptive=None, map_function=None):
+	# the test cases again, evaluated at unsorted query points of the given kinds instead of the uniform grid
+	query_cases = [params + (kind, nn) for params in cases for kind in queries]
+	generate_case = partial(generate_query_case, evaluate=evaluate, format_test_case=format_test_case, zero_threshold=zero_threshold)
+	with open_pool(map_function, requirements) as map_function, open_binary(binary, fields) as writer:
+		yield from join('\n\n', split_binary(writer, cached_map(adaptive_map(profiled_map(map_function, profiler), adaptive), generate_case, query_cases, cache)))
\ No newline at end of file
@@ -0,0 +1,132 @@
+import contextlib
+from functools import partial
+import json
+import os
+from common.adaptive import adaptive_map
+from common.binary import BinaryWriter, pack_array
+from common.cache import cached_map
+from common.formatting import to_decimals
+from common.profiling import file_name, profiled_map
+from common.stream import open_pool
+
+# numbers formatted at a time, so that no string grows with the size of a test case
+chunk_size = 1 << 12
+
+
+def write_array(file, array, precision, zero_threshold):
+	file.write('[')
+	for i in range(0, len(array), chunk_size):
+		file.write((', ' if i else '') + ', '.join(to_decimals(array[i:i+chunk_size], precision, zero_threshold)))
+	file.write(']')
+
+
+def write_test_case(path, header, fields, arrays, precision, zero_threshold):
+	# writes one test case to path.toml, in the same layout as the datasets, and its arrays to path.bin
+	with open(path + '.toml', 'w') as file:
+		file.write('\n'.join(['[[test_cases]]'] + header))
+		for field, array in zip(fields, arrays):
+			file.write(f'\n{field} = ')
+			write_array(file, array, precision, zero_threshold)
+	with contextlib.closing(BinaryWriter(path + '.bin', fields)) as writer:
+		writer.write_case([pack_array(array, zero_threshold) for array in arrays])
+
+
+def manifest_path(directory, name):
+	return os.path.join(directory, f'{name}.manifest.json')
+
+
+def write_manifest(directory, name, fields, shards):
+	# shards: dicts with the key, the TOML and binary paths relative to the directory,
+	# the number of test cases and the [start, end) byte range of every test case in the TOML shard
+	with open(manifest_path(directory, name), 'w') as file:
+		json.dump({'dataset': name, 'fields': fields, 'shards': shards}, file, indent='\t')
+
+
+def write_shards(name, cases, generate_case, fields, directory, requirements=None, preload=(), cache=None, profiler=None, adaptive=None, map_function=None):
+	# one shard per (func, dist), the first two parameters of every test case, indexed by <name>.manifest.json
+	with open_pool(map_function, requirements, preload) as map_function, open_sharded(directory, name, fields) as shards:
+		for params, (text, arrays) in zip(cases, cached_map(adaptive_map(profiled_map(map_function, profiler), adaptive), generate_case, cases, cache)):
+			shards.write_case(f'{params[0].__name__}-{params[1].__name__}', text, arrays)
+
+
+def write_stress_case(params, stress_case, fields, directory, nn, precision, zero_threshold):
+	# stress_case(params, nn) gives the header lines and the arrays of the test case
+	header, arrays = stress_case(params, nn)
+	path = os.path.join(directory, file_name(params))
+	write_test_case(path, header, fields, arrays, precision, zero_threshold)
+	return path
+
+
+def generate_stress_cases(name, cases, stress_case, fields, directory, nn, precision, zero_threshold, profiler=None, map_function=None):
+	# every test case is written to its own shard by the worker that computes it, so only file names come back;
+	# the manifest has the same format as the one of write_shards
+	os.makedirs(directory, exist_ok=True)
+	write_case = partial(write_stress_case, stress_case=stress_case, fields=fields, directory=directory, nn=nn, precision=precision, zero_threshold=zero_threshold)
+	shards = []
+	with open_pool(map_function) as map_function:
+		for path in profiled_map(map_function, profiler)(write_case, cases):
+			key = os.path.basename(path)
+			shards.append({'key': key, 'path': f'{key}.toml', 'binary': f'{key}.bin', 'cases': 1, 'offsets': [[0, os.path.getsize(f'{path}.toml')]]})
+			yield path
+	write_manifest(directory, name, fields, shards)
+
+
+class Shard:
+	def __init__(self, directory, name, key, fields, prefix, separator, suffix):
+		self.path = f'{name}-{key}.toml'
+		self.file = open(os.path.join(directory, self.path), 'wb')
+		self.binary = BinaryWriter(os.path.join(directory, f'{name}-{key}.bin'), fields) if fields else None
+		self.separator = separator.encode()
+		self.suffix = suffix.encode()
+		self.offset = self.file.write(prefix.encode())
+		self.offsets = []
+
+	def write_case(self, text, arrays):
+		if self.offsets:
+			self.offset += self.file.write(self.separator)
+		start = self.offset
+		self.offset += self.file.write(text.encode())
+		self.offsets.append([start, self.offset])
+		if self.binary:
+			self.binary.write_case(arrays)
+
+	def close(self):
+		self.file.write(self.suffix)
+		self.file.close()
+		if self.binary:
+			self.binary.close()
+
+
+class ShardedOutput:
+	# writes a dataset as one TOML file (and binary sidecar) per key, with a manifest indexing every test case
+	def __init__(self, directory, name, fields):
+		os.makedirs(directory, exist_ok=True)
+		self.directory = directory
+		self.name = name
+		self.fields = fields
+		self.shards = {}
+
+	def write_case(self, key, text, arrays, prefix='', separator='\n\n', suffix=''):
+		# the layout arguments take effect when the first test case of a key is written
+		if key not in self.shards:
+			self.shards[key] = Shard(self.directory, self.name, key, self.fields, prefix, separator, suffix)
+		self.shards[key].write_case(text, arrays)
+
+	def write_text(self, key, text):
+		# a shard without test cases, e.g. the mapping_intervals table of dist
+		self.shards[key] = Shard(self.directory, self.name, key, None, text, '', '')
+
+	def close(self):
+		for shard in self.shards.values():
+			shard.close()
+		write_manifest(self.directory, self.name, self.fields, [{
+			'key': key,
+			'path': shard.path,
+			'binary': shard.binary and os.path.basename(shard.binary.file.name),
+			'cases': len(shard.offsets),
+			'offsets': shard.offsets,
+		} for key, shard in self.shards.items()])
+
+
+def open_sharded(directory, name, fields):
+	return contextlib.closing(ShardedOutput(directory, name, fields))
\ No newline at end of file
@@ -0,0 +1,25 @@
+import itertools
+
+
+class Grid:
+	# a declarative grid of test cases: (name, values) axes in nesting order, the last one varying fastest;
+	# an axis named by a tuple, like ('a', 'b') for the intervals, spreads each of its values over those parameters
+	def __init__(self, *axes):
+		self.axes = axes
+
+	@property
+	def names(self):
+		return [name for axis, _ in self.axes for name in (axis if isinstance(axis, tuple) else (axis,))]
+
+	def replace(self, **values):
+		# the same grid with other values on the named axes, e.g. the point counts of a stress profile;
+		# an axis named by a tuple takes its names joined by underscores, like a_b=[(0, 1)] for ('a', 'b')
+		keys = [axis if isinstance(axis, str) else '_'.join(axis) for axis, _ in self.axes]
+		unknown = [name for name in values if name not in keys]
+		if unknown:
+			raise ValueError(f'Unknown axes: {", ".join(unknown)}')
+		return Grid(*[(axis, values.get(key, axis_values)) for key, (axis, axis_values) in zip(keys, self.axes)])
+
+	def __iter__(self):
+		for combination in itertools.product(*(values for _, values in self.axes)):
+			yield tuple(p for (axis, _), value in zip(self.axes, combination) for p in (value if isinstance(axis, tuple) else (value,)))
\ No newline at end of file
@@ -0,0 +1,68 @@
+import collections
+import contextlib
+from functools import partial
+import importlib
+import itertools
+from mpmath import mp
+import os
+import sys
+from common import formatting
+from common.plan import planned
+
+default_window = 4 * (os.cpu_count() or 1)
+
+
+def ordered_map(executor, function, params, window=default_window):
+	# like executor.map, but keeps at most `window` cases submitted or finished and not yet consumed
+	params = iter(params)
+	pending = collections.deque(executor.submit(function, p) for p in itertools.islice(params, window))
+	while pending:
+		result = pending.popleft().result()
+		for p in itertools.islice(params, 1):
+			pending.append(executor.submit(function, p))
+		yield result
+
+
+def join(separator, items):
+	for i, item in enumerate(items):
+		if i:
+			yield separator
+		yield item
+
+
+def open_output(path):
+	return open(path, 'w') if path else contextlib.nullcontext(sys.stdout)
+
+
+def warm_up(preload, dps):
+	# imports the modules the cases need and fills mpmath's cache of pi at the generator's precision,
+	# once per process instead of in the first case
+	for name in preload:
+		importlib.import_module(name)
+	with mp.workdps(dps):
+		+mp.pi
+
+
+def start_worker(preload, dps, mode):
+	# the state of the parent that the cases depend on, passed explicitly rather than inherited from a fork
+	formatting.set_mode(mode)
+	warm_up(preload, dps)
+
+
+@contextlib.contextmanager
+def pool_map(requirements=None, preload=()):
+	warm_up(preload, mp.dps)
+	if (os.cpu_count() or 1) == 1:
+		# a pool on one CPU only adds its startup and the pickling of every case
+		yield planned(map, requirements) if requirements else map
+		return
+	from concurrent.futures import ProcessPoolExecutor
+	with ProcessPoolExecutor(initializer=start_worker, initargs=(preload, mp.dps, formatting.mode)) as executor:
+		yield planned(partial(ordered_map, executor), requirements) if requirements else partial(ordered_map, executor)
+
+
+def open_pool(map_function=None, requirements=None, preload=()):
+	# an ordered map over a new process pool, unless the caller provides the map function (e.g. a shared pool);
+	# with requirements, the new pool first computes the shared intermediates of the test cases (see common/plan.py),
+	# which a caller providing the map function plans itself; preload names modules to import before the workers start
+	return contextlib.nullcontext(map_function) if map_function else pool_map(requirements, preload)
\ No newline at end of file
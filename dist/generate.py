@@ -1,7 +1,21 @@
 #!/usr/bin/env python3
 import argparse
 import inspect
+import itertools
 from mpmath import mp
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.adaptive import adaptive_map, open_adaptive
+from common.arguments import add_common_arguments
+from common.binary import open_binary, pack_array, split_binary
+from common.cache import cached_map, open_cache
+from common.formatting import set_mode, to_decimal, to_decimals
+from common.plan import intermediate
+from common.profiling import open_profiler, profiled_map
+from common.shards import open_sharded
+from common.spec import Grid
+from common.stream import join, open_output, open_pool
 
 mp.dps = 20
 
@@ -22,14 +36,13 @@ mapping_intervals = [
 	[-9999, 9999],
 ]
 
-
 def format_number(number):
-	return '0' if abs(number) < zero_threshold else mp.nstr(number, n=precision).removesuffix('.0')
+	return to_decimal(number, precision, zero_threshold)
 
 
 def format_test_case(n, a, b, points, **kwargs):
 	params = ''.join([f', {key}={format_number(value)}' for key, value in kwargs.items() if value is not None])
-	points_str = ', '.join(format_number(x) for x in points)
+	points_str = ', '.join(to_decimals(points, precision, zero_threshold))
 	return f'\t{{ n = {n}, a = {format_number(a)}, b = {format_number(b)}{params}, expected = [{points_str}] }},'
 
 
@@ -38,9 +51,12 @@ def stretched(points):
 		return []
 	if len(points) == 1 or min(points) == max(points):
 		return [(a+b)/2] * len(points)
-	return [a + (p-min(points)) * (b-a) / (max(points)-min(points)) for p in points]
+	lo, hi = min(points), max(points)
+	return [a + (p-lo) * (b-a) / (hi-lo) for p in points]
 
 
+# the node sets that other functions are built from are intermediates (see common/plan.py), computed once for all of them
+@intermediate()
 def uniform(n):
 	return [mp.mpf(0)] if n == 1 else [2 * mp.mpf(k) / (n-1) - 1 for k in range(n)]
 
@@ -53,6 +69,7 @@ def cubic(n):
 	return [-0.5 * x**3 + 1.5 * x for x in uniform(n)]
 
 
+@intermediate()
 def chebyshev(n):
 	return [-mp.cos((2*k - 1) * mp.pi / (2*n)) for k in range(1, n + 1)]
 
@@ -69,6 +86,7 @@ def chebyshev_2(n):
 	return [mp.sin(mp.pi / 2 * x) for x in uniform(n)]
 
 
+@intermediate()
 def chebyshev_3(n):
 	return [mp.cos(((2*n - 1 - 2*k) * mp.pi) / (2*n - 1)) for k in range(n)]
 
@@ -77,6 +95,7 @@ def chebyshev_3_stretched(n):
 	return stretched(chebyshev_3(n))
 
 
+@intermediate()
 def chebyshev_4(n):
 	return [mp.cos(((2*n - 2 - 2*k) * mp.pi) / (2*n - 1)) for k in range(n)]
 
@@ -85,6 +104,7 @@ def chebyshev_4_stretched(n):
 	return stretched(chebyshev_4(n))
 
 
+@intermediate()
 def chebyshev_ellipse(n, ratio):
 	return [mp.sign(2*k+1 - n) / mp.sqrt(1 + (mp.tan(mp.pi * (2*mp.mpf(k) + 1) / (2*n)) / ratio) ** 2) for k in range(n)]
 
@@ -101,6 +121,7 @@ def chebyshev_ellipse_2(n, ratio):
 	return [mp.mpf(0)] if n == 1 else [mp.sign(2*k+1 - n) / mp.sqrt(1 + (mp.tan(mp.pi * mp.mpf(k) / (n-1)) / ratio) ** 2) for k in range(n)]
 
 
+@intermediate()
 def chebyshev_ellipse_3(n, ratio):
 	return [(-1 if theta < mp.pi/2 else 1) / mp.sqrt(1 + (mp.tan(theta) / ratio) ** 2) for theta in (mp.pi * (2*k) / (2*n - 1) for k in range(n))]
 
@@ -109,6 +130,7 @@ def chebyshev_ellipse_3_stretched(n, ratio):
 	return stretched(chebyshev_ellipse_3(n, ratio))
 
 
+@intermediate()
 def chebyshev_ellipse_4(n, ratio):
 	return [(-1 if theta < mp.pi/2 else 1) / mp.sqrt(1 + (mp.tan(theta) / ratio) ** 2) for theta in (mp.pi * (2*k + 1) / (2*n - 1) for k in range(n))]
 
@@ -117,6 +139,7 @@ def chebyshev_ellipse_4_stretched(n, ratio):
 	return stretched(chebyshev_ellipse_4(n, ratio))
 
 
+@intermediate(depends=lambda n, steepness: [(uniform, (n,))])
 def logistic(n, steepness):
 	return [2 / (1 + mp.exp(-steepness * x)) - 1 for x in uniform(n)]
 
@@ -125,6 +148,7 @@ def logistic_stretched(n, steepness):
 	return stretched(logistic(n, steepness))
 
 
+@intermediate(depends=lambda n, steepness: [(uniform, (n,))])
 def erf(n, steepness):
 	return [mp.erf(steepness * x) for x in uniform(n)]
 
@@ -133,44 +157,103 @@ def erf_stretched(n, steepness):
 	return stretched(erf(n, steepness))
 
 
-def generate_test_cases():
-	mapping_intervals_section = 'mapping_intervals = [\n' + '\n'.join([f'\t[{i[0]}, {i[1]}],' for i in mapping_intervals]) + '\n]'
+functions = [uniform, quadratic, cubic, chebyshev, chebyshev_stretched, chebyshev_augmented, chebyshev_2,
+			chebyshev_3, chebyshev_3_stretched, chebyshev_4, chebyshev_4_stretched,
+			chebyshev_ellipse, chebyshev_ellipse_stretched, chebyshev_ellipse_augmented, chebyshev_ellipse_2,
+			chebyshev_ellipse_3, chebyshev_ellipse_3_stretched, chebyshev_ellipse_4, chebyshev_ellipse_4_stretched,
+			logistic, logistic_stretched, erf, erf_stretched]
+
+def parameters(func):
+	names = inspect.signature(func).parameters
+	if 'ratio' in names:
+		return [{'ratio': ratio} for ratio in ratios]
+	elif 'steepness' in names:
+		return [{'steepness': steepness} for steepness in steepnesses]
+	else:
+		return [{}]
+
+
+# the intermediate each of the other functions is built from, and the difference in its number of points
+built_from = {
+	quadratic: (uniform, 0),
+	cubic: (uniform, 0),
+	chebyshev_stretched: (chebyshev, 0),
+	chebyshev_augmented: (chebyshev, -2),
+	chebyshev_2: (uniform, 0),
+	chebyshev_3_stretched: (chebyshev_3, 0),
+	chebyshev_4_stretched: (chebyshev_4, 0),
+	chebyshev_ellipse_stretched: (chebyshev_ellipse, 0),
+	chebyshev_ellipse_augmented: (chebyshev_ellipse, -2),
+	chebyshev_ellipse_3_stretched: (chebyshev_ellipse_3, 0),
+	chebyshev_ellipse_4_stretched: (chebyshev_ellipse_4, 0),
+	logistic_stretched: (logistic, 0),
+	erf_stretched: (erf, 0),
+}
+
+# one grid per section, in file order
+specs = [Grid(('func', [func]), ('n', range(max_n + 1)), ('kwargs', parameters(func))) for func in functions]
+
+test_cases = [params for spec in specs for params in spec]
+
+
+def requirements(params):
+	func, n, kwargs = params
+	base, offset = (func, 0) if hasattr(func, 'depends') else built_from.get(func, (None, 0))
+	return [(base, (n + offset, *kwargs.values()))] if base and n + offset >= 0 else []
 
-	functions = [uniform, quadratic, cubic, chebyshev, chebyshev_stretched, chebyshev_augmented, chebyshev_2,
-				chebyshev_3, chebyshev_3_stretched, chebyshev_4, chebyshev_4_stretched,
-				chebyshev_ellipse, chebyshev_ellipse_stretched, chebyshev_ellipse_augmented, chebyshev_ellipse_2,
-				chebyshev_ellipse_3, chebyshev_ellipse_3_stretched, chebyshev_ellipse_4, chebyshev_ellipse_4_stretched,
-				logistic, logistic_stretched, erf, erf_stretched]
-	sections = []
 
-	for func in functions:
-		func_cases = []
-		for n in range(max_n + 1):
-			func_parameter_names = [p.name for p in inspect.signature(func).parameters.values()]
-			if 'ratio' in func_parameter_names:
-				for ratio in ratios:
-					func_cases.append(format_test_case(n, a, b, func(n, ratio), ratio=ratio))
-			elif 'steepness' in func_parameter_names:
-				for steepness in steepnesses:
-					func_cases.append(format_test_case(n, a, b, func(n, steepness), steepness=steepness))
-			else:
-				func_cases.append(format_test_case(n, a, b, func(n)))
-		section = f'[{func.__name__}]\ntest_cases = [\n' + '\n'.join(func_cases) + '\n]'
-		sections.append(section)
+def generate_test_case(params):
+	func, n, kwargs = params
+	# positional, as the intermediates are keyed by their arguments
+	points = func(n, *kwargs.values())
+	return format_test_case(n, a, b, points, **kwargs), [pack_array(points, zero_threshold)]
 
-	return mapping_intervals_section + '\n\n' + '\n\n'.join(sections)
+
+def sections(cache=None, profiler=None, adaptive=None, map_function=None, max_n=max_n):
+	# (func, test cases) for every section, in file order
+	grids = [list(spec.replace(n=range(max_n + 1))) for spec in specs]
+	with open_pool(map_function, requirements) as map_function:
+		results = cached_map(adaptive_map(profiled_map(map_function, profiler), adaptive), generate_test_case, [params for grid in grids for params in grid], cache)
+		for func, grid in zip(functions, grids):
+			yield func, list(itertools.islice(results, len(grid)))
+
+
+def format_mapping_intervals():
+	return 'mapping_intervals = [\n' + '\n'.join([f'\t[{i[0]}, {i[1]}],' for i in mapping_intervals]) + '\n]'
+
+
+def generate_test_cases(cache=None, binary=None, profiler=None, adaptive=None, map_function=None, max_n=max_n):
+	yield format_mapping_intervals()
+
+	with open_binary(binary, ['expected']) as writer:
+		for func, cases in sections(cache, profiler, adaptive, map_function, max_n):
+			yield f'\n\n[{func.__name__}]\ntest_cases = [\n'
+			yield from join('\n', split_binary(writer, cases))
+			yield '\n]'
+
+
+def write_shards(directory, cache=None, profiler=None, adaptive=None, map_function=None, max_n=max_n):
+	# one shard per section, indexed by dist.manifest.json
+	with open_sharded(directory, 'dist', ['expected']) as shards:
+		shards.write_text('mapping_intervals', format_mapping_intervals())
+		for func, cases in sections(cache, profiler, adaptive, map_function, max_n):
+			for text, arrays in cases:
+				shards.write_case(func.__name__, text, arrays, f'[{func.__name__}]\ntest_cases = [\n', '\n', '\n]')
 
 
 def main():
 	parser = argparse.ArgumentParser()
-	parser.add_argument('-o', '--output', type=str, help='Output file')
+	add_common_arguments(parser, 'dist', precision, 'section')
+	parser.add_argument('--max-n', type=int, default=max_n, help='Largest number of points (default: %(default)s)')
 	args = parser.parse_args()
-	output = generate_test_cases()
-	if not args.output:
-		print(output, end='')
-	else:
-		with open(args.output, 'w') as file:
-			file.write(output)
+	set_mode(args.number_format)
+	if args.shards:
+		with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive, open_profiler(args.profile, args.trace_memory) as profiler:
+			write_shards(args.shards, cache, profiler, adaptive, max_n=args.max_n)
+		return
+	with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive, open_profiler(args.profile, args.trace_memory) as profiler, open_output(args.output) as file:
+		for chunk in generate_test_cases(cache, args.binary, profiler, adaptive, max_n=args.max_n):
+			file.write(chunk)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from mpmath import mp
+import os
+import sys
+import time
+from common.adaptive import open_adaptive
+from common.cache import case_key, default_path, open_cache
+from common import formatting
+from common.formatting import modes, set_mode
+from common.generators import generators, load_generator, module_name, root
+from common.plan import compute_intermediates, provide, provided
+from common.stream import open_output, ordered_map
+
+# relative cost of a test case with n points and nn evaluation points, per generator;
+# only the order matters, the scale is folded together with mp.dps
+complexity = {
+	'dist': lambda n, nn: n,
+	'poly': lambda n, nn: n * (n + nn),
+	'barycentric': lambda n, nn: n * nn,
+	'step': lambda n, nn: n + nn,
+	'linear': lambda n, nn: n + nn,
+	'quadratic': lambda n, nn: n + nn,
+	'cubic': lambda n, nn: n + nn,
+}
+
+
+def case_cost(name, module, dps, params):
+	n = next(value for value in params if isinstance(value, int))
+	return complexity[name](n, getattr(module, 'nn', 0)) * dps
+
+
+class Planned(Exception):
+	pass
+
+
+def plan_cases(module, adaptive):
+	# runs the generator with a map function that records its cases and stops it before any result is needed;
+	# every generator maps all of its cases in a single call
+	cases = []
+	def record(function, params):
+		cases.extend((function, p) for p in params)
+		raise Planned
+		yield
+	try:
+		for _ in module.generate_test_cases(adaptive=adaptive, map_function=record):
+			pass
+	except Planned:
+		pass
+	return cases
+
+
+def start_worker(names, mode):
+	# the workers get the generators and the number format here rather than from the parent's memory, so that
+	# they do not depend on the pool forking; a forked worker already has the generators and keeps them
+	set_mode(mode)
+	for name in names:
+		if module_name(name) not in sys.modules:
+			load_generator(name)
+
+
+def run_case(dps, function, params):
+	# the workers are shared by all generators, so each case brings its generator's precision
+	mp.dps = dps
+	return function(params)
+
+
+def intermediates_map(executor, dps):
+	return lambda function, params: ordered_map(executor, partial(run_case, dps, function), params)
+
+
+def scheduled_map(queue):
+	# hands out the results submitted for this dataset, in the order the generator asks for them
+	def map_function(function, params):
+		for p in params:
+			planned, future = queue.popleft()
+			if planned != p:
+				raise RuntimeError('Test cases are requested in a different order than planned')
+			yield future.result()
+	return map_function
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Regenerate the datasets on one process pool shared by all generators')
+	parser.add_argument('datasets', nargs='*', help=f'Datasets to generate: {", ".join(generators)} (default: all)')
+	parser.add_argument('-o', '--output', type=str, default=root, help='Directory to write the datasets to (default: the repository)')
+	parser.add_argument('-b', '--binary', action='store_true', help='Also write the binary sidecar files')
+	parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes')
+	parser.add_argument('--number-format', choices=modes, default='decimal', help='Write numbers with 17 significant digits or as the shortest strings that round-trip to float64')
+	parser.add_argument('--cache', nargs='?', const=default_path, help='Reuse test cases from an on-disk cache (default: %(const)s)')
+	parser.add_argument('--adaptive-precision', action='store_true', help='Check that every test case is stable by computing it at increasing precision until its float64 output agrees, instead of once at its generator\'s mp.dps; this is slower')
+	parser.add_argument('--precision-log', type=str, help='With --adaptive-precision, write the precision used by each test case to this JSON file')
+	args = parser.parse_args()
+	unknown = [name for name in args.datasets if name not in generators]
+	if unknown:
+		parser.error(f'unknown datasets: {", ".join(unknown)} (choose from {", ".join(generators)})')
+	set_mode(args.number_format)
+	names = args.datasets or list(generators)
+	start = time.perf_counter()
+	modules, dps, queues = {}, {}, {}
+	# every generator is imported before the pool starts; its workers import them as well, see start_worker
+	for name in names:
+		modules[name] = load_generator(name)
+		dps[name] = mp.dps
+	with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive:
+		cases = []
+		for name in names:
+			mp.dps = dps[name]
+			planned = plan_cases(modules[name], adaptive)
+			if cache:
+				planned = [(function, p) for function, p in planned if not cache.contains(case_key(function, p))]
+			queues[name] = collections.deque()
+			cases += [(case_cost(name, modules[name], dps[name], p), name, i, function, p) for i, (function, p) in enumerate(planned)]
+		with ProcessPoolExecutor(args.jobs, initializer=start_worker, initargs=(names, formatting.mode)) as executor:
+			# the intermediates shared by the test cases of all datasets first, each computed once per precision
+			needs = {(name, i): getattr(modules[name], 'requirements', lambda p: [])(p) for _, name, i, _, p in cases}
+			values = {}
+			for precision in sorted(set(dps.values())):
+				with mp.workdps(precision):
+					values[precision] = compute_intermediates(intermediates_map(executor, precision), [need for (name, i), case in needs.items() if dps[name] == precision for need in case])
+			print(f'{sum(len(v) for v in values.values())} shared intermediates computed for {sum(len(case) for case in needs.values())} uses', file=sys.stderr, flush=True)
+			futures = {}
+			for _, name, i, function, p in sorted(cases, key=lambda case: -case[0]):
+				with mp.workdps(dps[name]):
+					futures[name, i] = executor.submit(run_case, dps[name], partial(provided, function), (p, provide(needs[name, i], values[dps[name]])))
+			for _, name, i, function, p in sorted(cases, key=lambda case: case[1:3]):
+				queues[name].append((p, futures[name, i]))
+			for name in names:
+				script, dataset, binary = generators[name]
+				mp.dps = dps[name]
+				path = os.path.join(args.output, dataset)
+				os.makedirs(os.path.dirname(path), exist_ok=True)
+				with open_output(path) as file:
+					for chunk in modules[name].generate_test_cases(cache=cache, adaptive=adaptive, binary=os.path.join(args.output, binary) if args.binary else None, map_function=scheduled_map(queues[name])):
+						file.write(chunk)
+				if queues[name]:
+					raise RuntimeError(f'{name}: {len(queues[name])} planned test cases were not used')
+				print(f'{path} ({time.perf_counter() - start:.2f} s)', file=sys.stderr, flush=True)
+
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
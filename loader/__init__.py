@@ -0,0 +1,2 @@
+from loader.dataset import Dataset, open_dataset
+from loader.index import load_index
\ No newline at end of file
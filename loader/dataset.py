@@ -0,0 +1,132 @@
+import collections
+import json
+import mmap
+import os
+import tomllib
+from common.binary import parse_binary
+from common.generators import generators, root
+from loader.index import load_index
+
+
+class Part:
+	# one TOML file of a dataset, with its index and, opened on first use, its binary sidecar
+	def __init__(self, path, binary):
+		self.path = path
+		self.binary_path = binary if binary and os.path.exists(binary) else None
+		self.index = load_index(path)
+		self.file = open(path, 'rb')
+		self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+		self.binary = None
+
+	def text(self, start, end):
+		return self.buffer[start:end].decode()
+
+	def arrays(self, i):
+		if self.binary_path is None:
+			raise ValueError(f'{self.path} has no binary sidecar')
+		if self.binary is None:
+			with open(self.binary_path, 'rb') as file:
+				self.binary = parse_binary(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))[1]
+		return self.binary[i]
+
+	def close(self):
+		self.binary = None
+		if isinstance(self.buffer, mmap.mmap):
+			self.buffer.close()
+		self.file.close()
+
+
+def matches(value, criterion):
+	if callable(criterion):
+		return criterion(value)
+	if isinstance(criterion, (list, tuple, set, frozenset, range)):
+		return value in criterion
+	return value == criterion
+
+
+class Dataset:
+	# lazy access to the test cases of a dataset: only the index is read when it is opened, and a test case is
+	# parsed (case) or mapped from the binary sidecar (view) when it is asked for
+	def __init__(self, parts):
+		self.parts = parts
+		self.locations = [(part, i) for part in parts for i in range(len(part.index['cases']))]
+		fields = []
+		for part in parts:
+			fields.extend(field for field in part.index['fields'] if field not in fields)
+		# a key that only some test cases have, like the cheb_coeffs of the Chebyshev node sets in poly, or that the
+		# binary sidecar leaves out, defaults to None
+		self.sectioned = any(case['section'] is not None for part in parts for case in part.index['cases'])
+		self.TestCase = collections.namedtuple('TestCase', (['section'] if self.sectioned else []) + fields, defaults=[None] * (len(fields) + self.sectioned))
+
+	def __len__(self):
+		return len(self.locations)
+
+	def meta(self, i):
+		# the scalar keys of test case i, from the index; n is the number of points X where there is no n key
+		part, j = self.locations[i]
+		case = part.index['cases'][j]
+		return {'section': case['section'], **case['meta']} if self.sectioned else case['meta']
+
+	def case(self, i):
+		part, j = self.locations[i]
+		case = part.index['cases'][j]
+		text = part.text(*case['offsets'])
+		values = tomllib.loads(text)['test_cases'][0] if case['section'] is None else tomllib.loads(f'case = {text}')['case']
+		return self.TestCase(**({'section': case['section']} if self.sectioned else {}), **values)
+
+	def view(self, i):
+		# test case i with float64 memoryviews into the binary sidecar for its arrays and the index for the rest;
+		# nothing is parsed, and the views stay valid until the dataset is closed
+		part, j = self.locations[i]
+		meta = {key: value for key, value in self.meta(i).items() if key in self.TestCase._fields}
+		return self.TestCase(**meta, **part.arrays(j))
+
+	def indices(self, **criteria):
+		# test cases whose keys match every criterion: a value, a collection of values or a predicate
+		return [i for i in range(len(self)) if all(key in self.meta(i) and matches(self.meta(i)[key], criterion) for key, criterion in criteria.items())]
+
+	def cases(self, **criteria):
+		return (self.case(i) for i in self.indices(**criteria))
+
+	def views(self, **criteria):
+		return (self.view(i) for i in self.indices(**criteria))
+
+	def __getitem__(self, i):
+		return self.case(range(len(self))[i])
+
+	def __iter__(self):
+		return self.cases()
+
+	def sections(self):
+		return [name for part in self.parts for name in part.index['sections']]
+
+	def read_section(self, name):
+		# a whole section parsed, e.g. mapping_intervals of dist
+		for part in self.parts:
+			if name in part.index['sections']:
+				return tomllib.loads(part.text(*part.index['sections'][name]))[name]
+		raise KeyError(name)
+
+	def close(self):
+		for part in self.parts:
+			part.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def open_dataset(path):
+	# path is a dataset name (dist, poly, barycentric, step, linear, quadratic, cubic), a TOML file with an optional
+	# binary sidecar next to it, or a manifest written by --shards or --stress
+	if path in generators:
+		_, dataset, binary = generators[path]
+		return Dataset([Part(os.path.join(root, dataset), os.path.join(root, binary))])
+	if path.endswith('.manifest.json'):
+		with open(path) as file:
+			manifest = json.load(file)
+		directory = os.path.dirname(path)
+		return Dataset([Part(os.path.join(directory, shard['path']), shard['binary'] and os.path.join(directory, shard['binary'])) for shard in manifest['shards']])
+	return Dataset([Part(path, os.path.splitext(path)[0] + '.bin')])
\ No newline at end of file
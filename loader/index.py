@@ -0,0 +1,110 @@
+# Byte-offset index of a dataset file: where every section and every test case starts and ends, with the
+# scalar keys of every test case (func, dist, type, n, ...) so that test cases can be selected without parsing.
+# Both layouts are covered: [[test_cases]] blocks with one key per line (poly, barycentric, splines), and
+# [section] tables with one inline table per test case and line (dist).
+import hashlib
+import json
+import os
+import re
+import tomllib
+
+# the on-disk cache of the indexes: $ALFI_TEST_DATA_CACHE, else alfi-test-data in $XDG_CACHE_HOME or ~/.cache;
+# None keeps them in memory only, which is also where they stay once the directory turns out not to be writable
+cache_directory = os.environ.get('ALFI_TEST_DATA_CACHE') or os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'alfi-test-data')
+version = 1
+
+section_header = re.compile(rb'\[([A-Za-z0-9_.-]+)\]')
+key_line = re.compile(rb'([A-Za-z0-9_-]+) = (.*)')
+
+indexes = {}
+
+
+def inline_meta(line):
+	# the scalar keys of an inline table, which come before its arrays
+	start = line.index(b'{') + 1
+	bracket = line.find(b'[', start)
+	if bracket < 0:
+		scalars, array = line[start:line.rindex(b'}')], None
+	else:
+		comma = line.rfind(b',', start, bracket)
+		scalars, array = line[start:max(comma, start)], line[comma+1:bracket].split(b'=')[0].strip().decode()
+	meta = tomllib.loads('case = {' + scalars.decode() + '}')['case']
+	return meta, [array] if array else []
+
+
+def scan(path):
+	sections, cases, fields = {}, [], []
+	def add_fields(keys):
+		fields.extend(key for key in keys if key not in fields)
+	section = block = None
+	offset = 0
+	with open(path, 'rb') as file:
+		for line in file:
+			start, offset = offset, offset + len(line)
+			line = line.rstrip(b'\r\n')
+			end = start + len(line)
+			if not line.strip():
+				block = None
+			elif line == b'[[test_cases]]':
+				block = {'section': None, 'offsets': [start, end], 'meta': {}}
+				cases.append(block)
+			elif block is not None:
+				block['offsets'][1] = end
+				key, value = key_line.fullmatch(line).groups()
+				key = key.decode()
+				add_fields([key])
+				if value.startswith(b'['):
+					if key == 'X' and 'n' not in block['meta']:
+						block['meta']['n'] = 0 if value.strip() == b'[]' else value.count(b',') + 1
+				else:
+					block['meta'][key] = tomllib.loads(line.decode())[key]
+			elif match := section_header.fullmatch(line):
+				section = match.group(1).decode()
+				sections[section] = [start, end]
+			elif line.lstrip().startswith(b'{'):
+				meta, arrays = inline_meta(line)
+				add_fields(list(meta) + arrays)
+				line = line.rstrip().removesuffix(b',')
+				cases.append({'section': section, 'offsets': [start + len(line) - len(line.lstrip()), start + len(line)], 'meta': meta})
+				sections[section][1] = end
+			elif section is None and (match := key_line.fullmatch(line)):
+				# a top-level key before the first section, e.g. mapping_intervals
+				section = match.group(1).decode()
+				sections[section] = [start, end]
+			elif section is not None:
+				sections[section][1] = end
+	return {'sections': sections, 'fields': fields, 'cases': cases}
+
+
+def cache_path(path):
+	return os.path.join(cache_directory, hashlib.sha1(path.encode()).hexdigest() + '.json')
+
+
+def load_index(path):
+	# the index of the file at path, from memory or the on-disk cache while the file is unchanged, else scanned
+	global cache_directory
+	path = os.path.abspath(path)
+	stat = os.stat(path)
+	stamp = [version, stat.st_size, stat.st_mtime_ns]
+	if path in indexes and indexes[path][0] == stamp:
+		return indexes[path][1]
+	index = None
+	if cache_directory is not None:
+		try:
+			with open(cache_path(path)) as file:
+				cached = json.load(file)
+			if cached['path'] == path and cached['stamp'] == stamp:
+				index = cached['index']
+		except (OSError, ValueError, KeyError):
+			pass
+	if index is None:
+		index = scan(path)
+		if cache_directory is not None:
+			try:
+				os.makedirs(cache_directory, exist_ok=True)
+				with open(cache_path(path), 'w') as file:
+					json.dump({'path': path, 'stamp': stamp, 'index': index}, file)
+			except OSError:
+				cache_directory = None
+	indexes[path] = (stamp, index)
+	return index
\ No newline at end of file
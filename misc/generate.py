@@ -1,7 +1,25 @@
 #!/usr/bin/env python3
 import argparse
-from concurrent.futures import ProcessPoolExecutor
+import bisect
+from functools import partial
 from mpmath import mp
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.adaptive import adaptive_map, open_adaptive
+from common.arguments import add_common_arguments, add_grid_arguments, add_stress_arguments
+from common.binary import open_binary, pack_array, split_binary
+from common.cache import cached_map, open_cache
+from common.fixed import FixedVector
+from common.formatting import set_mode, to_decimals
+from common.grids import generate_grid_cases
+from common.multipole import cauchy_sums
+from common.nodes import chebyshev, chebyshev_2, f2, uniform
+from common.plan import evaluation_grid, intermediate, nodes
+from common.profiling import open_profiler, profiled_map
+from common.shards import generate_stress_cases, write_shards
+from common.spec import Grid
+from common.stream import join, open_output, open_pool
 
 mp.dps = 30
 
@@ -10,48 +28,24 @@ zero_threshold = mp.mpf('1e-20')
 
 nn = 101
 
+grid_nn = 1000000
 
-def uniform(n):
-	return [mp.mpf(0)] if n == 1 else [2 * mp.mpf(k) / (n-1) - 1 for k in range(n)]
-def chebyshev(n):
-	return [-mp.cos((2*k - 1) * mp.pi / (2*n)) for k in range(1, n + 1)]
-def chebyshev_2(n):
-	return [mp.sin(mp.pi / 2 * x) for x in uniform(n)]
+# the Chebyshev node sets only: the weights of uniform nodes grow like binomial(n - 1, n/2)
+stress_point_counts = [10000, 100000]
+stress_nn = 100000
 
 
-def f2(x):
-	return -3*mp.sin(10*x) + 10*mp.sin(mp.fabs(x) + x/2)
+specs = [
+	Grid(('func', [f2]), ('dist', [uniform]), ('n', [9]), (('a', 'b'), [(-10, 10)])),
+	Grid(('func', [f2]), ('dist', [chebyshev, chebyshev_2]), ('n', [49, 99, 199]), (('a', 'b'), [(-10, 10)])),
+]
+test_cases = [params for spec in specs for params in spec]
 
-
-test_cases = []
-
-for func in [f2]:
-	for dist in [uniform]:
-		for n in [9]:
-			for a, b in [(-10, 10)]:
-				test_cases.append((func, dist, n, a, b))
-
-for func in [f2]:
-	for dist in [chebyshev, chebyshev_2]:
-		for n in [49, 99, 199]:
-			for a, b in [(-10, 10)]:
-				test_cases.append((func, dist, n, a, b))
-
-
-def stretched(points, a, b):
-	if not points:
-		return []
-	if len(points) == 1 or min(points) == max(points):
-		return [(a+b)/2] * len(points)
-	return [a + (p-min(points)) * (b-a) / (max(points)-min(points)) for p in points]
-
-
-def format_number(number):
-	return '0' if abs(number) < zero_threshold else mp.nstr(number, n=precision).removesuffix('.0')
+binary_fields = ['X', 'Y', 'xx', 'yy']
 
 
 def format_array(array):
-	return '[' + ', '.join(format_number(x) for x in array) + ']'
+	return '[' + ', '.join(to_decimals(array, precision, zero_threshold)) + ']'
 
 
 def format_test_case(func, dist, X, Y, xx, yy):
@@ -66,61 +60,127 @@ def format_test_case(func, dist, X, Y, xx, yy):
 	])
 
 
-def barycentric(X, Y, xx, dist, epsilon):
+def product_weights(X):
+	# w_k = 1 / prod_{j != k} (x_k - x_j), normalized to max |w_k| = 1. The products are accumulated as sums of
+	# log |x_k - x_j| with the signs counted apart, and the largest sum is subtracted before exp, so that no
+	# intermediate overflows or underflows whatever n and b - a; the guard bits cover the rounding of sums of n logs
 	n = len(X)
-	nn = len(xx)
-
-	if dist == 'uniform':
-		c = [(-1)**k * mp.binomial(n - 1, k) for k in range(n)]
-	elif dist == 'chebyshev':
-		c = [(-1)**k * mp.sin(((2 * k + 1) * mp.pi) / (2 * n)) for k in range(n)]
-	elif dist == 'chebyshev_2':
-		c = [(-1)**k * (mp.mpf('1/2') if k == 0 or k == n - 1 else mp.mpf(1)) for k in range(n)]
+	if n == 1:
+		return [mp.mpf(1)]
+	with mp.extraprec(n.bit_length() + 8):
+		logs, signs = [], []
+		for k in range(n):
+			differences = [X[k] - X[j] for j in range(n) if j != k]
+			logs.append(-mp.fsum(mp.log(mp.fabs(d)) for d in differences))
+			signs.append(-1 if sum(d < 0 for d in differences) % 2 else 1)
+		top = max(logs)
+		w = [sign * mp.exp(log - top) for sign, log in zip(signs, logs)]
+	return [+x for x in w]
+
+
+# the weights are an intermediate (see common/plan.py), like the shared node sets and evaluation grid
+@intermediate(depends=lambda dist, n, a, b: [(nodes, (dist, n, a, b))])
+def barycentric_weights(dist, n, a, b):
+	if dist is uniform:
+		return [(-1)**k * mp.binomial(n - 1, k) for k in range(n)]
+	elif dist is chebyshev:
+		return [(-1)**k * mp.sin(((2 * k + 1) * mp.pi) / (2 * n)) for k in range(n)]
+	elif dist is chebyshev_2:
+		return [(-1)**k * (mp.mpf('1/2') if k == 0 or k == n - 1 else mp.mpf(1)) for k in range(n)]
 	else:
-		raise ValueError(f'Unexpected distribution type: {dist!r}')
-
-	numer = [mp.mpf(0)] * nn
-	denom = [mp.mpf(0)] * nn
-	exact = [-1] * nn
+		return product_weights(nodes(dist, n, a, b))
 
-	for k in range(n):
-		for i, xi in enumerate(xx):
-			xdiff = xi - X[k]
-			if mp.fabs(xdiff) < epsilon:
-				exact[i] = k
-			else:
-				temp = c[k] / xdiff
-				numer[i] += temp * Y[k]
-				denom[i] += temp
 
-	yy = [Y[exact[i]] if exact[i] != -1 else numer[i] / denom[i] for i in range(nn)]
-	return yy
+def requirements(params):
+	func, dist, n, a, b = params
+	return [(nodes, (dist, n, a, b)), (barycentric_weights, (dist, n, a, b)), (evaluation_grid, (nn, a, b))]
+
+
+def barycentric(X, Y, xx, c, epsilon, multipole=False):
+	order = sorted(range(len(X)), key=lambda k: X[k])
+	X_sorted = [X[k] for k in order]
+	exact = []
+	for x in xx:
+		i = bisect.bisect_left(X_sorted, x)
+		near = [order[j] for j in (i - 1, i) if 0 <= j < len(X) and mp.fabs(x - X_sorted[j]) < epsilon]
+		exact.append(near[-1] if near else None)
+	rest = [x for x, k in zip(xx, exact) if k is None]
+	if multipole:
+		# far-field expansions for large n and nn, see common/multipole.py
+		numerators, denominators = cauchy_sums(X, [[w * y for w, y in zip(c, Y)], c], rest)
+		quotients = iter([numerator / denominator for numerator, denominator in zip(numerators, denominators)])
+	else:
+		# the sums over the nodes run on fixed-point ints; only the two sums of every x are rounded to mpf
+		X_fixed, Y_fixed, c_fixed = FixedVector.from_mpf(X), FixedVector.from_mpf(Y), FixedVector.from_mpf(c)
+		def quotient(x):
+			temp = c_fixed.divide(x - X_fixed)
+			return temp.dot(Y_fixed) / temp.sum()
+		quotients = map(quotient, rest)
+	return [Y[k] if k is not None else next(quotients) for k in exact]
 
 
-def generate_test_case(params):
+def construct(params):
 	func, dist, n, a, b = params
-	X = stretched(dist(n), a, b)
+	X = nodes(dist, n, a, b)
 	Y = [func(x) for x in X]
-	xx = stretched(uniform(nn), a, b)
-	yy = barycentric(X, Y, xx, dist.__name__, zero_threshold)
-	return format_test_case(func, dist, X, Y, xx, yy)
+	c = barycentric_weights(dist, n, a, b)
+	return X, Y, c
+
+
+def evaluate(params, nn, multipole=False):
+	X, Y, c = construct(params)
+	func, dist, n, a, b = params
+	xx = evaluation_grid(nn, a, b)
+	return X, Y, xx, barycentric(X, Y, xx, c, zero_threshold, multipole)
+
+
+def generate_test_case(params, multipole=False):
+	func, dist, n, a, b = params
+	X, Y, xx, yy = evaluate(params, nn, multipole)
+	return format_test_case(func, dist, X, Y, xx, yy), [pack_array(array, zero_threshold) for array in [X, Y, xx, yy]]
 
 
-def generate_test_cases():
-	with ProcessPoolExecutor() as executor:
-		return '\n\n'.join(executor.map(generate_test_case, test_cases))
+def generate_test_cases(multipole=False, cache=None, binary=None, profiler=None, adaptive=None, map_function=None):
+	with open_pool(map_function, requirements) as map_function, open_binary(binary, binary_fields) as writer:
+		yield from join('\n\n', split_binary(writer, cached_map(adaptive_map(profiled_map(map_function, profiler), adaptive), partial(generate_test_case, multipole=multipole), test_cases, cache)))
+
+
+def stress_case(params, nn):
+	# the sums run on the far-field evaluator, which the direct sum cannot keep up with at these sizes
+	func, dist, n, a, b = params
+	return [f'func = "{func.__name__}"', f'dist = "{dist.__name__}"'], evaluate(params, nn, multipole=True)
+
+
+def grid_case(params, multipole=False):
+	X, Y, c = construct(params)
+	return [X, Y], partial(barycentric, X, Y, c=c, epsilon=zero_threshold, multipole=multipole)
 
 
 def main():
 	parser = argparse.ArgumentParser()
-	parser.add_argument('-o', '--output', type=str, help='Output file')
+	add_common_arguments(parser, 'barycentric', precision)
+	parser.add_argument('--multipole', action='store_true', help='Evaluate the barycentric sums with far-field expansions, accurate to the working precision, instead of directly')
+	add_stress_arguments(parser, stress_point_counts, stress_nn, '; it always uses --multipole')
+	add_grid_arguments(parser, grid_nn)
 	args = parser.parse_args()
-	output = generate_test_cases()
-	if not args.output:
-		print(output, end='')
-	else:
-		with open(args.output, 'w') as file:
-			file.write(output)
+	set_mode(args.number_format)
+	if args.grid:
+		with open_profiler(args.profile, args.trace_memory) as profiler:
+			for path in generate_grid_cases(test_cases, partial(grid_case, multipole=args.multipole), binary_fields, args.grid, args.grid_nn, zero_threshold, profiler):
+				print(path)
+		return
+	if args.stress:
+		with open_profiler(args.profile, args.trace_memory) as profiler:
+			for path in generate_stress_cases('barycentric', specs[1].replace(n=args.stress_n), stress_case, binary_fields, args.stress, args.stress_nn, precision, zero_threshold, profiler):
+				print(f'{path}.toml')
+		return
+	if args.shards:
+		with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive, open_profiler(args.profile, args.trace_memory) as profiler:
+			write_shards('barycentric', test_cases, partial(generate_test_case, multipole=args.multipole), binary_fields, args.shards, requirements, cache=cache, profiler=profiler, adaptive=adaptive)
+		return
+	with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive, open_profiler(args.profile, args.trace_memory) as profiler, open_output(args.output) as file:
+		for chunk in generate_test_cases(args.multipole, cache, args.binary, profiler, adaptive):
+			file.write(chunk)
 
 
 if __name__ == '__main__':
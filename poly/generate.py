@@ -1,8 +1,23 @@
 #!/usr/bin/env python3
 import argparse
-from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from mpmath import mp
-import sympy as sp
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.adaptive import adaptive_map, open_adaptive
+from common.arguments import add_common_arguments, add_grid_arguments
+from common.binary import open_binary, pack_array, split_binary
+from common.cache import cached_map, open_cache
+from common.chebyshev import clenshaw, coefficients_first_kind, coefficients_second_kind
+from common.formatting import set_mode, to_decimals
+from common.grids import generate_grid_cases
+from common.nodes import chebyshev, chebyshev_2, cos, exp, f1, f2, sin, uniform
+from common.plan import case_requirements, evaluation_grid, samples
+from common.profiling import open_profiler, profiled_map
+from common.shards import write_shards
+from common.spec import Grid
+from common.stream import join, open_output, open_pool
 
 mp.dps = 50
 
@@ -11,95 +26,164 @@ zero_threshold = mp.mpf('1e-40')
 
 nn = 23
 
-def exp(x):
-	return mp.exp(x)
-def sin(x):
-	return mp.sin(x)
-def cos(x):
-	return mp.cos(x)
-def f1(x):
-	return mp.fabs(x) + x/2 - x*x
-def f2(x):
-	return -3*mp.sin(10*x) + 10*mp.sin(mp.fabs(x) + x/2)
-
-def uniform(n):
-	return [mp.mpf(0)] if n == 1 else [2 * mp.mpf(k) / (n-1) - 1 for k in range(n)]
-def chebyshev(n):
-	return [-mp.cos((2*k - 1) * mp.pi / (2*n)) for k in range(1, n + 1)]
-def chebyshev_2(n):
-	return [mp.sin(mp.pi / 2 * x) for x in uniform(n)]
-
-test_cases = []
+grid_nn = 1000000
 
 functions = [exp, sin, cos, f1, f2]
 distributions = [uniform, chebyshev, chebyshev_2]
 point_counts = [7, 15, 25]
 intervals = [(-2, 2), (-10, 10)]
 
-for func in functions:
-	for dist in distributions:
-		for n in point_counts:
-			for a, b in intervals:
-				test_cases.append((func, dist, n, a, b))
+spec = Grid(('func', functions), ('dist', distributions), ('n', point_counts), (('a', 'b'), intervals))
+test_cases = list(spec)
+requirements = case_requirements(spec.names, nn)
 
+# cheb_coeffs is written to the TOML for the Chebyshev node sets only, so the binary sidecar, whose fields are the
+# same for every case, leaves it out
+binary_fields = ['X', 'Y', 'coeffs', 'xx', 'yy']
 
-def stretched(points, a, b):
-	if not points:
-		return []
-	if len(points) == 1 or min(points) == max(points):
-		return [(a+b)/2] * len(points)
-	return [a + (p-min(points)) * (b-a) / (max(points)-min(points)) for p in points]
-
-
-def format_number(number):
-	return '0' if abs(number) < zero_threshold else mp.nstr(number, n=precision).removesuffix('.0')
+# with --chebyshev-n, the Chebyshev node sets alone at larger point counts, without the monomial coefficients,
+# whose conditioning grows exponentially with n
+chebyshev_distributions = [chebyshev, chebyshev_2]
+chebyshev_fields = ['X', 'Y', 'cheb_coeffs', 'xx', 'yy']
 
 
 def format_array(array):
-	return '[' + ', '.join(format_number(x) for x in array) + ']'
+	return '[' + ', '.join(to_decimals(array, precision, zero_threshold)) + ']'
 
 
-def format_test_case(func, dist, X, Y, coeffs, xx, yy):
+def format_test_case(func, dist, X, Y, coeffs, cheb_coeffs, xx, yy):
 	return '\n'.join([
 		'[[test_cases]]',
 		f'func = "{func.__name__}"',
 		f'dist = "{dist.__name__}"',
 		f'X = {format_array(X)}',
 		f'Y = {format_array(Y)}',
-		f'coeffs = {format_array(coeffs)}',
+		*([f'coeffs = {format_array(coeffs)}'] if coeffs is not None else []),
+		*([f'cheb_coeffs = {format_array(cheb_coeffs)}'] if cheb_coeffs is not None else []),
 		f'xx = {format_array(xx)}',
 		f'yy = {format_array(yy)}',
 	])
 
 
+def divided_differences(X, Y):
+	c = list(Y)
+	for j in range(1, len(X)):
+		for i in reversed(range(j, len(X))):
+			c[i] = (c[i] - c[i-1]) / (X[i] - X[i-j])
+	return c
+
+
+def newton_to_monomial(X, c):
+	# expands c[0] + (x-X[0])*(c[1] + (x-X[1])*(...)) into coefficients in descending order
+	coeffs = [c[-1]]
+	for k in reversed(range(len(c) - 1)):
+		coeffs = coeffs + [c[k]]
+		for i in reversed(range(1, len(coeffs))):
+			coeffs[i] -= X[k] * coeffs[i-1]
+	return coeffs
+
+
+def horner(coeffs, x):
+	result = mp.mpf(0)
+	for c in coeffs:
+		result = result * x + c
+	return result
+
+
+def chebyshev_variable(dist, n, a, b, x):
+	# the variable t of the Chebyshev series: stretching put the extreme nodes at a and b, and in t the nodes are
+	# the roots of T_n (chebyshev) or the extrema of T_(n-1) (chebyshev_2)
+	scale = mp.cospi(mp.mpf(1) / (2*n)) if dist is chebyshev else 1
+	return scale * (2*x - a - b) / (b - a)
+
+
+def chebyshev_coefficients(dist, Y):
+	# the nodes ascend, so their t = cos(angle) are in the reverse order of the transforms
+	if dist is chebyshev:
+		return coefficients_first_kind(Y[::-1])
+	elif dist is chebyshev_2:
+		return coefficients_second_kind(Y[::-1])
+	return None
+
+
+def construct(params, monomial=True):
+	func, dist, n, a, b = params
+	X, Y = samples(func, dist, n, a, b)
+	coeffs = newton_to_monomial(X, divided_differences(X, Y)) if monomial else None
+	return X, Y, coeffs, chebyshev_coefficients(dist, Y)
+
+
+def interpolate(coeffs, xx):
+	return [horner(coeffs, x) for x in xx]
+
+
+def interpolate_chebyshev(dist, n, a, b, cheb_coeffs, xx):
+	return [clenshaw(cheb_coeffs, chebyshev_variable(dist, n, a, b, x)) for x in xx]
+
+
+def interpolant(params, coeffs, cheb_coeffs):
+	# the Chebyshev series where there is one: O(n) per point like Horner, but without the cancellation of the monomials
+	func, dist, n, a, b = params
+	return partial(interpolate_chebyshev, dist, n, a, b, cheb_coeffs) if cheb_coeffs is not None else partial(interpolate, coeffs)
+
+
 def generate_test_case(params):
 	func, dist, n, a, b = params
-	X = stretched(dist(n), a, b)
-	Y = [func(x) for x in X]
-	x_sym = sp.symbols('x')
-	polynomial = sp.interpolate(list(zip(X, Y)), x_sym)
-	coeffs = [polynomial.coeff(x_sym, i) for i in reversed(range(n))]
-	f = sp.lambdify(x_sym, polynomial, modules='mpmath')
-	xx = stretched(uniform(nn), a, b)
-	yy = [f(x) for x in xx]
-	return format_test_case(func, dist, X, Y, coeffs, xx, yy)
+	X, Y, coeffs, cheb_coeffs = construct(params)
+	xx = evaluation_grid(nn, a, b)
+	yy = interpolant(params, coeffs, cheb_coeffs)(xx)
+	return format_test_case(func, dist, X, Y, coeffs, cheb_coeffs, xx, yy), [pack_array(array, zero_threshold) for array in [X, Y, coeffs, xx, yy]]
+
+
+def generate_chebyshev_case(params):
+	func, dist, n, a, b = params
+	X, Y, _, cheb_coeffs = construct(params, monomial=False)
+	xx = evaluation_grid(nn, a, b)
+	yy = interpolate_chebyshev(dist, n, a, b, cheb_coeffs, xx)
+	return format_test_case(func, dist, X, Y, None, cheb_coeffs, xx, yy), [pack_array(array, zero_threshold) for array in [X, Y, cheb_coeffs, xx, yy]]
+
+
+def generate_chebyshev_cases(point_counts, cache=None, binary=None, profiler=None, adaptive=None, map_function=None):
+	# the Chebyshev node sets at other point counts, e.g. degree 1000 and more
+	cases = list(spec.replace(dist=chebyshev_distributions, n=point_counts))
+	with open_pool(map_function, requirements) as map_function, open_binary(binary, chebyshev_fields) as writer:
+		yield from join('\n\n', split_binary(writer, cached_map(adaptive_map(profiled_map(map_function, profiler), adaptive), generate_chebyshev_case, cases, cache)))
+
+
+def generate_test_cases(cache=None, binary=None, profiler=None, adaptive=None, map_function=None):
+	with open_pool(map_function, requirements) as map_function, open_binary(binary, binary_fields) as writer:
+		yield from join('\n\n', split_binary(writer, cached_map(adaptive_map(profiled_map(map_function, profiler), adaptive), generate_test_case, test_cases, cache)))
 
 
-def generate_test_cases():
-	with ProcessPoolExecutor() as executor:
-		return '\n\n'.join(executor.map(generate_test_case, test_cases))
+def grid_case(params):
+	X, Y, coeffs, cheb_coeffs = construct(params)
+	return [X, Y, coeffs], interpolant(params, coeffs, cheb_coeffs)
 
 
 def main():
 	parser = argparse.ArgumentParser()
-	parser.add_argument('-o', '--output', type=str, help='Output file')
+	add_common_arguments(parser, 'poly', precision)
+	add_grid_arguments(parser, grid_nn)
+	parser.add_argument('--chebyshev-n', type=int, nargs='+', metavar='N', help='Write the Chebyshev node sets with these point counts, with Chebyshev coefficients only, instead of the dataset')
 	args = parser.parse_args()
-	output = generate_test_cases()
-	if not args.output:
-		print(output, end='')
-	else:
-		with open(args.output, 'w') as file:
-			file.write(output)
+	set_mode(args.number_format)
+	if args.grid:
+		with open_profiler(args.profile, args.trace_memory) as profiler:
+			for path in generate_grid_cases(test_cases, grid_case, binary_fields, args.grid, args.grid_nn, zero_threshold, profiler):
+				print(path)
+		return
+	if args.chebyshev_n:
+		with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive, open_profiler(args.profile, args.trace_memory) as profiler, open_output(args.output) as file:
+			for chunk in generate_chebyshev_cases(args.chebyshev_n, cache, args.binary, profiler, adaptive):
+				file.write(chunk)
+		return
+	if args.shards:
+		with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive, open_profiler(args.profile, args.trace_memory) as profiler:
+			write_shards('poly', test_cases, generate_test_case, binary_fields, args.shards, requirements, cache=cache, profiler=profiler, adaptive=adaptive)
+		return
+	with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive, open_profiler(args.profile, args.trace_memory) as profiler, open_output(args.output) as file:
+		for chunk in generate_test_cases(cache, args.binary, profiler, adaptive):
+			file.write(chunk)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,23 @@
 #!/usr/bin/env python3
 import argparse
-from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from mpmath import mp
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.adaptive import adaptive_map, open_adaptive
+from common.arguments import add_common_arguments, add_grid_arguments, add_query_arguments, add_stress_arguments
+from common.binary import open_binary, pack_array, split_binary
+from common.cache import cached_map, open_cache
+from common.formatting import set_mode, to_decimals
+from common.grids import generate_grid_cases
+from common.nodes import chebyshev, chebyshev_2, f2, uniform
+from common.plan import case_requirements, evaluation_grid, samples
+from common.profiling import describe_case, open_profiler, profiled_map
+from common.queries import generate_query_cases, query_points, segment
+from common.shards import generate_stress_cases, write_shards
+from common.spec import Grid
+from common.stream import join, open_output, open_pool
 
 mp.dps = 20
 
@@ -10,59 +26,35 @@ zero_threshold = mp.mpf('1e-18')
 
 nn = 23
 
-def exp(x):
-	return mp.exp(x)
-def sin(x):
-	return mp.sin(x)
-def cos(x):
-	return mp.cos(x)
-def f1(x):
-	return mp.fabs(x) + x/2 - x*x
-def f2(x):
-	return -3*mp.sin(10*x) + 10*mp.sin(mp.fabs(x) + x/2)
-
-def uniform(n):
-	return [mp.mpf(0)] if n == 1 else [2 * mp.mpf(k) / (n-1) - 1 for k in range(n)]
-def chebyshev(n):
-	return [-mp.cos((2*k - 1) * mp.pi / (2*n)) for k in range(1, n + 1)]
-def chebyshev_2(n):
-	return [mp.sin(mp.pi / 2 * x) for x in uniform(n)]
-
-test_cases = []
-
 functions = [f2]
 distributions = [uniform, chebyshev, chebyshev_2]
 point_counts = [11]
 intervals = [(-10, 10)]
 
-for func in functions:
-	for dist in distributions:
-		for n in point_counts:
-			for a, b in intervals:
-				test_cases.append((func, dist, n, a, b))
+spec = Grid(('func', functions), ('dist', distributions), ('n', point_counts), (('a', 'b'), intervals))
+test_cases = list(spec)
+requirements = case_requirements(spec.names, nn)
 
+binary_fields = ['X', 'Y', 'coeffs', 'xx', 'yy']
 
-def stretched(points, a, b):
-	if not points:
-		return []
-	if len(points) == 1 or min(points) == max(points):
-		return [(a+b)/2] * len(points)
-	return [a + (p-min(points)) * (b-a) / (max(points)-min(points)) for p in points]
+query_nn = 1000
 
+stress_point_counts = [10000, 100000]
+stress_nn = 100000
 
-def format_number(number):
-	return '0' if abs(number) < zero_threshold else mp.nstr(number, n=precision).removesuffix('.0')
+grid_nn = 1000000
 
 
 def format_array(array):
-	return '[' + ', '.join(format_number(x) for x in array) + ']'
+	return '[' + ', '.join(to_decimals(array, precision, zero_threshold)) + ']'
 
 
-def format_test_case(func, dist, X, Y, coeffs, xx, yy):
+def format_test_case(func, dist, X, Y, coeffs, xx, yy, queries=None):
 	return '\n'.join([
 		'[[test_cases]]',
 		f'func = "{func.__name__}"',
 		f'dist = "{dist.__name__}"',
+		*([f'queries = "{queries}"'] if queries else []),
 		f'X = {format_array(X)}',
 		f'Y = {format_array(Y)}',
 		f'coeffs = {format_array(coeffs)}',
@@ -71,36 +63,79 @@ def format_test_case(func, dist, X, Y, coeffs, xx, yy):
 	])
 
 
-def generate_test_case(params):
+def construct(params):
 	func, dist, n, a, b = params
-	X = stretched(dist(n), a, b)
-	Y = [func(x) for x in X]
+	X, Y = samples(func, dist, n, a, b)
 	coeffs = [c for i in range(len(X) - 1) for c in [(Y[i+1]-Y[i])/(X[i+1]-X[i]), Y[i]]]
-	xx = stretched(uniform(nn), a, b)
+	return X, Y, coeffs
+
+
+def interpolate(X, coeffs, xx):
 	yy = []
-	cur_segment = 0
 	for x in xx:
-		while cur_segment + 1 < len(X) - 1 and X[cur_segment + 1] <= x:
-			cur_segment += 1
+		cur_segment = segment(X, x)
 		yy.append(coeffs[2*cur_segment+0] * (x - X[cur_segment]) + coeffs[2*cur_segment+1])
-	return format_test_case(func, dist, X, Y, coeffs, xx, yy)
+	return yy
+
+
+def evaluate(params, nn, queries=None):
+	func, dist, n, a, b = params
+	X, Y, coeffs = construct(params)
+	xx = evaluation_grid(nn, a, b) if queries is None else query_points(queries, X, a, b, nn, describe_case(params))
+	return X, Y, coeffs, xx, interpolate(X, coeffs, xx)
+
+
+def generate_test_case(params):
+	func, dist, n, a, b = params
+	X, Y, coeffs, xx, yy = evaluate(params, nn)
+	return format_test_case(func, dist, X, Y, coeffs, xx, yy), [pack_array(array, zero_threshold) for array in [X, Y, coeffs, xx, yy]]
+
+
+def generate_test_cases(cache=None, binary=None, profiler=None, adaptive=None, map_function=None):
+	with open_pool(map_function, requirements) as map_function, open_binary(binary, binary_fields) as writer:
+		yield from join('\n\n', split_binary(writer, cached_map(adaptive_map(profiled_map(map_function, profiler), adaptive), generate_test_case, test_cases, cache)))
+
+
+def stress_case(params, nn):
+	func, dist, n, a, b = params
+	return [f'func = "{func.__name__}"', f'dist = "{dist.__name__}"'], evaluate(params, nn)
 
 
-def generate_test_cases():
-	with ProcessPoolExecutor() as executor:
-		return '\n\n'.join(executor.map(generate_test_case, test_cases))
+def grid_case(params):
+	X, Y, coeffs = construct(params)
+	return [X, Y, coeffs], partial(interpolate, X, coeffs)
 
 
 def main():
 	parser = argparse.ArgumentParser()
-	parser.add_argument('-o', '--output', type=str, help='Output file')
+	add_common_arguments(parser, 'linear', precision)
+	add_query_arguments(parser, query_nn)
+	add_stress_arguments(parser, stress_point_counts, stress_nn)
+	add_grid_arguments(parser, grid_nn)
 	args = parser.parse_args()
-	output = generate_test_cases()
-	if not args.output:
-		print(output, end='')
-	else:
-		with open(args.output, 'w') as file:
-			file.write(output)
+	set_mode(args.number_format)
+	if args.grid:
+		with open_profiler(args.profile, args.trace_memory) as profiler:
+			for path in generate_grid_cases(test_cases, grid_case, binary_fields, args.grid, args.grid_nn, zero_threshold, profiler):
+				print(path)
+		return
+	if args.stress:
+		with open_profiler(args.profile, args.trace_memory) as profiler:
+			for path in generate_stress_cases('linear', spec.replace(n=args.stress_n), stress_case, binary_fields, args.stress, args.stress_nn, precision, zero_threshold, profiler):
+				print(f'{path}.toml')
+		return
+	if args.shards:
+		with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive, open_profiler(args.profile, args.trace_memory) as profiler:
+			write_shards('linear', test_cases, generate_test_case, binary_fields, args.shards, requirements, cache=cache, profiler=profiler, adaptive=adaptive)
+		return
+	if args.queries:
+		with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive, open_profiler(args.profile, args.trace_memory) as profiler, open_output(args.output) as file:
+			for chunk in generate_query_cases(test_cases, args.queries, args.query_nn, evaluate, format_test_case, binary_fields, zero_threshold, case_requirements(spec.names), cache, args.binary, profiler, adaptive):
+				file.write(chunk)
+		return
+	with open_cache(args.cache) as cache, open_adaptive(args.adaptive_precision, args.precision_log) as adaptive, open_profiler(args.profile, args.trace_memory) as profiler, open_output(args.output) as file:
+		for chunk in generate_test_cases(cache, args.binary, profiler, adaptive):
+			file.write(chunk)
 
 
 if __name__ == '__main__':
@@ -1,20 +1,204 @@
 #!/usr/bin/env python3
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import inspect
+import linecache
+import os
+import signal
+import struct
 import subprocess
-import tempfile
-
-def execute_command(command):
-	print(' '.join(command), flush=True)
-	subprocess.check_call(command)
-
-def check_data(original, generator):
-	with tempfile.NamedTemporaryFile() as tmpfile:
-		execute_command([generator, '-o', tmpfile.name])
-		execute_command(['diff', original, tmpfile.name])
-
-check_data('dist/dist.toml', 'dist/generate.py')
-check_data('poly/poly.toml', 'poly/generate.py')
-check_data('misc/barycentric.toml', 'misc/generate.py')
-check_data('spline/step.toml', 'spline/generate_step.py')
-check_data('spline/linear.toml', 'spline/generate_linear.py')
-check_data('spline/quadratic.toml', 'spline/generate_quadratic.py')
-check_data('spline/cubic.toml', 'spline/generate_cubic.py')
\ No newline at end of file
+import sys
+import time
+import tomllib
+from common import cache, fixed
+from common.binary import parse_binary
+from common.generators import generators, load_generator, root
+
+chunk_size = 1 << 16
+
+
+def ordered_bits(x):
+	bits = struct.unpack('<q', struct.pack('<d', x))[0]
+	return bits if bits >= 0 else -(bits & 0x7fffffffffffffff)
+
+
+def ulp_distance(x, y):
+	return abs(ordered_bits(x) - ordered_bits(y))
+
+
+def case_name(case):
+	return ', '.join(f'{key}={case[key]}' for key in ['func', 'dist', 'type', 'n'] if key in case)
+
+
+def compare_values(expected, actual, path):
+	if isinstance(expected, float) or isinstance(actual, float):
+		if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+			return None, ulp_distance(float(expected), float(actual))
+		return f'{path}: {expected!r} != {actual!r}', 0
+	if isinstance(expected, list) and isinstance(actual, list):
+		if len(expected) != len(actual):
+			return f'{path}: length {len(expected)} != {len(actual)}', 0
+		max_ulp = 0
+		for i, (e, a) in enumerate(zip(expected, actual)):
+			error, ulp = compare_values(e, a, f'{path}[{i}]')
+			if error:
+				return error, 0
+			max_ulp = max(max_ulp, ulp)
+		return None, max_ulp
+	if isinstance(expected, dict) and isinstance(actual, dict):
+		if expected.keys() != actual.keys():
+			return f'{path}: keys {sorted(expected)} != {sorted(actual)}', 0
+		max_ulp = 0
+		for key in expected:
+			error, ulp = compare_values(expected[key], actual[key], f'{path}.{key}' if path else key)
+			if error:
+				return error, 0
+			max_ulp = max(max_ulp, ulp)
+		return None, max_ulp
+	return (None, 0) if expected == actual else (f'{path}: {expected!r} != {actual!r}', 0)
+
+
+def compare_numeric(expected, actual, max_ulp):
+	try:
+		expected, actual = tomllib.loads(expected), tomllib.loads(actual)
+	except tomllib.TOMLDecodeError as e:
+		return f'cannot parse output: {e}'
+	if expected.keys() != actual.keys():
+		return f'sections {list(expected)} != {list(actual)}'
+	for section in expected:
+		expected_cases, actual_cases = expected[section], actual[section]
+		if isinstance(expected_cases, dict):
+			expected_cases, actual_cases = expected_cases.get('test_cases'), actual_cases.get('test_cases')
+		if not expected_cases or not isinstance(expected_cases[0], dict):
+			error, _ = compare_values(expected_cases, actual_cases, section)
+			if error:
+				return error
+			continue
+		if len(expected_cases) != len(actual_cases):
+			return f'{section}: {len(expected_cases)} test cases != {len(actual_cases)}'
+		for i, (e, a) in enumerate(zip(expected_cases, actual_cases)):
+			error, ulp = compare_values(e, a, '')
+			if error or ulp > max_ulp:
+				return f'{section}[{i}] ({case_name(e)}): ' + (error or f'{ulp} ULP apart')
+	return None
+
+
+def first_difference(expected, actual, offset, line):
+	i = next((i for i, (e, a) in enumerate(zip(expected, actual)) if e != a), min(len(expected), len(actual)))
+	if line is None:
+		return f'first difference at byte {offset + i}'
+	line += expected.count(b'\n', 0, i)
+	return f'first difference at line {line}, byte {offset + i}'
+
+
+def compare_binary(expected, actual, max_ulp):
+	try:
+		expected_fields, expected_cases = parse_binary(expected)
+		actual_fields, actual_cases = parse_binary(actual)
+	except (ValueError, struct.error) as e:
+		return f'cannot parse binary output: {e}'
+	if expected_fields != actual_fields:
+		return f'binary fields {expected_fields} != {actual_fields}'
+	if len(expected_cases) != len(actual_cases):
+		return f'{len(expected_cases)} binary test cases != {len(actual_cases)}'
+	for i, (e, a) in enumerate(zip(expected_cases, actual_cases)):
+		error, ulp = compare_values({k: list(v) for k, v in e.items()}, {k: list(v) for k, v in a.items()}, '')
+		if error or ulp > max_ulp:
+			return f'binary case {i}: ' + (error or f'{ulp} ULP apart')
+	return None
+
+
+def compare_stream(stream, original, stop, text=True):
+	# compares chunks as they arrive; calls stop() at the first difference, or keeps reading if stop is None
+	error = None
+	output = []
+	offset, line = 0, 1 if text else None
+	with open(original, 'rb') as file:
+		while chunk := stream.read(chunk_size):
+			expected = file.read(len(chunk))
+			if stop is None:
+				output.append(chunk)
+			if error is None and chunk != expected:
+				error = first_difference(expected, chunk, offset, line)
+				if stop:
+					stop()
+					break
+			offset += len(chunk)
+			if text:
+				line += chunk.count(b'\n')
+		if error is None and file.read(1):
+			error = f'output is truncated at byte {offset}'
+	return error, b''.join(output)
+
+
+def check_data(original, binary, generator, numeric, max_ulp):
+	start = time.perf_counter()
+	read_fd, write_fd = os.pipe()
+	# a new session lets us kill the generator together with its worker processes, which share its pipes
+	with subprocess.Popen([generator, '--binary', f'/dev/fd/{write_fd}'], stdout=subprocess.PIPE, pass_fds=[write_fd], start_new_session=True) as process:
+		os.close(write_fd)
+		stop = None if numeric else lambda: os.killpg(process.pid, signal.SIGKILL)
+		with os.fdopen(read_fd, 'rb') as binary_stream, ThreadPoolExecutor(1) as executor:
+			binary_result = executor.submit(compare_stream, binary_stream, binary, stop, False)
+			error, output = compare_stream(process.stdout, original, stop)
+			binary_error, binary_output = binary_result.result()
+	if stop and error and binary_error:
+		# the first difference in one stream kills the generator and cuts the other one short
+		error, binary_error = (None, binary_error) if error.startswith('output is truncated') else (error, None)
+	if process.returncode and not (error or binary_error):
+		return f'exited with status {process.returncode}', time.perf_counter() - start
+	if numeric and not process.returncode:
+		if error:
+			with open(original, 'rb') as file:
+				error = compare_numeric(file.read().decode(), output.decode(), max_ulp)
+		if binary_error:
+			with open(binary, 'rb') as file:
+				binary_error = compare_binary(file.read(), binary_output, max_ulp)
+	if binary_error:
+		binary_error = f'{binary}: {binary_error}'
+	return '; '.join(e for e in [error, binary_error] if e) or None, time.perf_counter() - start
+
+
+def check_cache_keys():
+	# an edit to a method of a class in common must change the cache keys of the test cases that use it; the edit is
+	# made in linecache, where inspect reads the sources from, rather than in the file
+	module = load_generator('barycentric')
+	params = module.test_cases[0]
+	key = cache.case_key(module.generate_test_case, params)
+	path = inspect.getsourcefile(fixed)
+	lines, start = inspect.getsourcelines(fixed.FixedVector.to_mpf)
+	size, mtime, original, fullname = linecache.cache[path]
+	edited = list(original)
+	edited[start] = edited[start].rstrip('\n') + '  # edited\n'
+	linecache.cache[path] = (size, mtime, edited, fullname)
+	cache.source_closure.cache_clear()
+	try:
+		if cache.case_key(module.generate_test_case, params) == key:
+			return 'editing FixedVector.to_mpf does not change the cache keys of barycentric'
+	finally:
+		linecache.cache[path] = (size, mtime, original, fullname)
+		cache.source_closure.cache_clear()
+	return None
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-j', '--jobs', type=int, default=len(generators), help='Number of generators to run at once')
+	parser.add_argument('--numeric', action='store_true', help='Compare test cases field by field instead of byte by byte')
+	parser.add_argument('--max-ulp', type=int, default=0, help='Largest accepted ULP distance in --numeric mode')
+	args = parser.parse_args()
+	os.chdir(root)
+	error = check_cache_keys()
+	print(f'cache keys: {error or "OK"}', flush=True)
+	failed = error is not None
+	with ThreadPoolExecutor(args.jobs) as executor:
+		futures = [executor.submit(check_data, original, binary, generator, args.numeric, args.max_ulp) for generator, original, binary in generators.values()]
+		for (generator, original, binary), future in zip(generators.values(), futures):
+			error, elapsed = future.result()
+			print(f'{generator}: {error or "OK"} ({elapsed:.2f} s)', flush=True)
+			failed |= error is not None
+	sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file